@@ -8,9 +8,14 @@ This script provides a command-line interface for admin users to manage users, l
 Authors:
 - Mohammad Shajadul Karim (Admin-CLI)
 """
+import argparse
+import json
+import random
 import requests
 import sys
 import re
+import sqlite3
+import time
 from getpass import getpass
 from typing import Dict, Any, Optional, Union
 from rich.console import Console
@@ -18,6 +23,7 @@ from rich.table import Table
 from rich.prompt import Prompt, Confirm
 from tabulate import tabulate
 import jwt
+import snapshot
 
 # --- Configuration ---
 AUTH_SERVICE_BASE_URL = "http://localhost:8000/api/auth/"
@@ -26,6 +32,12 @@ ADMIN_AUTH_BASE_URL = "http://localhost:8000/admin/auth/"
 LISTINGS_SERVICE_BASE_URL = "http://localhost:8001/api/listings/"
 ADMIN_LISTINGS_BASE_URL = "http://localhost:8001/admin/listings/" 
 ADMIN_REVIEWS_BASE_URL = "http://localhost:8001/admin/reviews/" 
+LISTING_SERVICE_BASE_URL = "http://localhost:8001/api/listing/"
+SYNC_SERVICE_URL = "http://localhost:8001/api/sync/"
+# Local SQLite file used by the offline snapshot/query commands
+SNAPSHOT_DB_PATH = "admin_snapshot.sqlite3"
+# How often a snapshot request is retried when the listings service sheds it (429/503)
+FETCH_RETRIES = 8
 console = Console()
 
 # --- Session Management ---
@@ -288,8 +300,8 @@ def listing_menu():
 def review_menu():
     while True:
         console.rule("[bold blue]Review Management")
-        console.print("[1] List reviews for a listing\n[2] View review details\n[4] Update review\n[5] Delete review\n[0] Back")
-        choice = Prompt.ask("Choose an option", choices=["1","2","4","5","0"])
+        console.print("[1] List reviews for a listing\n[2] View review details\n[4] Update review\n[5] Delete review\n[6] Bulk moderate reviews from file\n[0] Back")
+        choice = Prompt.ask("Choose an option", choices=["1","2","4","5","6","0"])
         if choice == "1":
             home_id = Prompt.ask("Home ID")
             if not home_id:
@@ -365,20 +377,137 @@ def review_menu():
                 result = make_request('DELETE', f"http://localhost:8001/api/listing/{home_id}/review/{review_id}/")
                 if result is not None:
                     console.print("[green]Review deleted successfully![green]")
+        elif choice == "6":
+            path = Prompt.ask("JSON file with a list of operations ({listing_id, review_id, action: delete|update, comments})")
+            try:
+                with open(path) as f:
+                    operations = json.load(f)
+            except (OSError, ValueError) as e:
+                console.print(f"[red]Could not read operations:[/red] {e}")
+                continue
+            if not isinstance(operations, list) or not operations:
+                console.print("[red]The file must contain a non-empty JSON list.[/red]")
+                continue
+            if Confirm.ask(f"Apply {len(operations)} moderation operations?"):
+                result = make_request('POST', f"{ADMIN_REVIEWS_BASE_URL}bulk/", {'operations': operations})
+                if result:
+                    console.print(f"[green]Moderation applied:[/green] {result.get('modified', 0)} of {result.get('writes', 0)} writes modified a listing")
+                    for error in result.get('errors', []):
+                        console.print(f"[yellow]Operation {error['index']}[/yellow]: {error['error']}")
         elif choice == "0":
             break
 
+def retry_after_seconds(response) -> float:
+    try:
+        return min(float(response.headers.get('Retry-After', 1)), 60)
+    except ValueError:
+        return 1
+
+def fetch_json(url: str) -> Union[Dict[str, Any], list, None]:
+    """
+    Quiet GET used by the snapshot workers; returns None instead of printing errors.
+    Requests rejected by the listings service's admission control are retried after
+    the Retry-After it sends, with jitter so the workers don't retry in lockstep.
+    """
+    try:
+        for attempt in range(FETCH_RETRIES + 1):
+            response = requests.get(url, headers=get_auth_headers(), timeout=30)
+            if response.status_code not in (429, 503) or attempt == FETCH_RETRIES:
+                break
+            time.sleep(retry_after_seconds(response) + random.uniform(0, 1))
+        response.raise_for_status()
+        return response.json() if response.text else []
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+def ask_optional(prompt: str, cast=str):
+    value = Prompt.ask(f"{prompt} (leave blank to skip)", default="")
+    if not value:
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        console.print(f"[yellow]Ignoring invalid value for {prompt}[/yellow]")
+        return None
+
+def snapshot_menu():
+    conn = snapshot.open_snapshot(SNAPSHOT_DB_PATH)
+    try:
+        while True:
+            console.rule("[bold blue]Offline Snapshot")
+            last_snapshot = snapshot.get_meta(conn, 'last_snapshot_at')
+            console.print(f"[dim]Snapshot file: {SNAPSHOT_DB_PATH} (last refreshed: {last_snapshot or 'never'})[/dim]")
+            console.print("[1] Take/refresh snapshot\n[2] Query listings\n[3] Aggregate listings\n[4] Run SQL\n[0] Back")
+            choice = Prompt.ask("Choose an option", choices=["1","2","3","4","0"])
+            if choice == "1":
+                full = Confirm.ask("Full refresh (re-fetch reviews for every listing)?", default=last_snapshot is None)
+                with console.status("Pulling listings, reviews and users..."):
+                    try:
+                        stats = snapshot.take_snapshot(
+                            conn,
+                            fetch_json,
+                            LISTINGS_SERVICE_BASE_URL,
+                            LISTING_SERVICE_BASE_URL,
+                            f"{AUTH_SERVICE_BASE_URL}users/",
+                            SYNC_SERVICE_URL,
+                            full=full,
+                        )
+                    except RuntimeError as e:
+                        console.print(f"[red]Snapshot failed:[/red] {e}")
+                        continue
+                console.print(
+                    f"[green]Snapshot updated in {stats['seconds']:.1f}s:[/green] "
+                    f"{stats['listings']} listings ({stats['refreshed']} refreshed, {stats['removed']} removed), "
+                    f"{stats['reviews']} reviews fetched, "
+                    f"{stats['users'] if stats['users'] is not None else 'no'} users"
+                )
+            elif choice == "2":
+                rows, elapsed_ms = snapshot.query_listings(
+                    conn,
+                    country=ask_optional("Country"),
+                    property_type=ask_optional("Property type"),
+                    min_price=ask_optional("Min price", float),
+                    max_price=ask_optional("Max price", float),
+                    min_bedrooms=ask_optional("Min bedrooms", int),
+                    max_reviews=ask_optional("Max number of reviews", int),
+                    sort_by=Prompt.ask("Sort by", choices=["none"] + list(snapshot.SORT_OPTIONS), default="none"),
+                    limit=ask_optional("Max rows", int) or 50,
+                )
+                display_table(rows, list(snapshot.LISTING_COLUMNS), title="Snapshot listings")
+                console.print(f"[dim]{len(rows)} rows in {elapsed_ms:.2f} ms[/dim]")
+            elif choice == "3":
+                group_by = Prompt.ask("Group by", choices=["country", "property_type", "bedrooms"], default="country")
+                rows, elapsed_ms = snapshot.aggregate_listings(conn, group_by)
+                display_table(rows, [group_by, 'listings', 'avg_price', 'avg_rating', 'reviews'], title=f"Listings by {group_by}")
+                console.print(f"[dim]{len(rows)} rows in {elapsed_ms:.2f} ms[/dim]")
+            elif choice == "4":
+                sql = Prompt.ask("SQL (tables: listings, reviews, users)")
+                try:
+                    rows, elapsed_ms = snapshot.run_sql(conn, sql)
+                except Exception as e:
+                    console.print(f"[red]Query failed:[/red] {e}")
+                    continue
+                if rows:
+                    display_table(rows, list(rows[0].keys()), title="Query result")
+                console.print(f"[dim]{len(rows)} rows in {elapsed_ms:.2f} ms[/dim]")
+            elif choice == "0":
+                break
+    finally:
+        conn.close()
+
 def main_menu():
     while True:
         console.rule("[bold green]Admin Menu")
-        console.print("[1] Users\n[2] Listings\n[3] Reviews\n[0] Exit")
-        choice = Prompt.ask("Choose an option", choices=["1","2","3","0"])
+        console.print("[1] Users\n[2] Listings\n[3] Reviews\n[4] Offline snapshot\n[0] Exit")
+        choice = Prompt.ask("Choose an option", choices=["1","2","3","4","0"])
         if choice == "1":
             user_menu()
         elif choice == "2":
             listing_menu()
         elif choice == "3":
             review_menu()
+        elif choice == "4":
+            snapshot_menu()
         elif choice == "0":
             console.print("[bold red]Goodbye!")
             sys.exit(0)
@@ -393,6 +522,76 @@ def get_logged_in_user_id():
             return ''
     return ''
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Admin CLI for Distributed Vacation HBS")
+    parser.add_argument('--snapshot-db', default=SNAPSHOT_DB_PATH, help="SQLite snapshot file")
+    commands = parser.add_subparsers(dest='command')
+    snapshot_parser = commands.add_parser('snapshot', help="Pull listings, reviews and users into the local snapshot")
+    snapshot_parser.add_argument('--full', action='store_true', help="Re-fetch reviews for every listing")
+    query_parser = commands.add_parser('query', help="Filter or aggregate listings in the local snapshot")
+    query_parser.add_argument('--country')
+    query_parser.add_argument('--property-type')
+    query_parser.add_argument('--min-price', type=float)
+    query_parser.add_argument('--max-price', type=float)
+    query_parser.add_argument('--min-bedrooms', type=int)
+    query_parser.add_argument('--max-reviews', type=int)
+    query_parser.add_argument('--sort-by', choices=list(snapshot.SORT_OPTIONS))
+    query_parser.add_argument('--limit', type=int, default=50)
+    query_parser.add_argument('--group-by', choices=list(snapshot.LISTING_COLUMNS), help="Aggregate instead of listing rows")
+    query_parser.add_argument('--sql', help="Run a read-only SQL statement")
+    return parser.parse_args(argv)
+
+def run_command(args):
+    conn = snapshot.open_snapshot(args.snapshot_db)
+    try:
+        if args.command == 'snapshot':
+            stats = snapshot.take_snapshot(
+                conn,
+                fetch_json,
+                LISTINGS_SERVICE_BASE_URL,
+                LISTING_SERVICE_BASE_URL,
+                f"{AUTH_SERVICE_BASE_URL}users/",
+                SYNC_SERVICE_URL,
+                full=args.full or snapshot.get_meta(conn, 'last_snapshot_at') is None,
+            )
+            console.print_json(data=stats)
+            return
+        if args.sql:
+            try:
+                rows, elapsed_ms = snapshot.run_sql(conn, args.sql)
+            except sqlite3.Error as e:
+                console.print(f"[red]Query failed:[/red] {e}")
+                sys.exit(1)
+            fields = list(rows[0].keys()) if rows else []
+        elif args.group_by:
+            rows, elapsed_ms = snapshot.aggregate_listings(conn, args.group_by)
+            fields = [args.group_by, 'listings', 'avg_price', 'avg_rating', 'reviews']
+        else:
+            rows, elapsed_ms = snapshot.query_listings(
+                conn,
+                country=args.country,
+                property_type=args.property_type,
+                min_price=args.min_price,
+                max_price=args.max_price,
+                min_bedrooms=args.min_bedrooms,
+                max_reviews=args.max_reviews,
+                sort_by=args.sort_by,
+                limit=args.limit,
+            )
+            fields = list(snapshot.LISTING_COLUMNS)
+        display_table(rows, fields)
+        console.print(f"[dim]{len(rows)} rows in {elapsed_ms:.2f} ms[/dim]")
+    finally:
+        conn.close()
+
 if __name__ == "__main__":
-    if login():
-        main_menu() 
\ No newline at end of file
+    args = parse_args(sys.argv[1:])
+    SNAPSHOT_DB_PATH = args.snapshot_db
+    if args.command == 'query':
+        # Queries run against the local snapshot only, no login needed
+        run_command(args)
+    elif login():
+        if args.command == 'snapshot':
+            run_command(args)
+        else:
+            main_menu() 
\ No newline at end of file
@@ -0,0 +1,370 @@
+"""
+snapshot.py
+
+Offline snapshot store for the Admin CLI of Distributed Vacation HBS (Hotel Booking System)
+
+Pulls listings, reviews and users from the backend services into a local, indexed
+SQLite file so that ad-hoc admin reporting can run locally without paging the live
+API. Later runs refresh the snapshot incrementally: reviews are only re-fetched for
+listings that are new, whose summary changed, or that the listings service's change
+feed (`/api/sync/`) reports review writes for. Listings that no longer exist are dropped.
+"""
+import hashlib
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Page size used when pulling from the listings service (the service caps it at 100)
+PAGE_SIZE = 100
+# Concurrent requests; kept within the listings service's per-admin concurrency cap
+MAX_WORKERS = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    listing_id TEXT PRIMARY KEY,
+    name TEXT,
+    price REAL,
+    country TEXT,
+    bedrooms INTEGER,
+    property_type TEXT,
+    review_scores_rating REAL,
+    picture_url TEXT,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    content_hash TEXT NOT NULL,
+    synced_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_listings_country ON listings (country COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_listings_price ON listings (price);
+CREATE INDEX IF NOT EXISTS idx_listings_property_type ON listings (property_type);
+CREATE INDEX IF NOT EXISTS idx_listings_review_count ON listings (review_count);
+
+CREATE TABLE IF NOT EXISTS reviews (
+    review_id TEXT NOT NULL,
+    listing_id TEXT NOT NULL,
+    reviewer_id TEXT,
+    reviewer_name TEXT,
+    comments TEXT,
+    date TEXT,
+    PRIMARY KEY (listing_id, review_id)
+);
+CREATE INDEX IF NOT EXISTS idx_reviews_reviewer ON reviews (reviewer_id);
+CREATE INDEX IF NOT EXISTS idx_reviews_date ON reviews (date);
+
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    email TEXT,
+    is_active INTEGER,
+    is_staff INTEGER,
+    raw TEXT
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Columns an admin may filter, group or sort by; keeps user input out of the SQL text
+LISTING_COLUMNS = (
+    'listing_id', 'name', 'price', 'country', 'bedrooms',
+    'property_type', 'review_scores_rating', 'review_count',
+)
+SORT_OPTIONS = {
+    'price_asc': 'price ASC',
+    'price_desc': 'price DESC',
+    'rating_desc': 'review_scores_rating DESC',
+    'reviews_asc': 'review_count ASC',
+    'reviews_desc': 'review_count DESC',
+}
+
+FetchJson = Callable[[str], Any]
+
+
+def open_snapshot(path: str) -> sqlite3.Connection:
+    """Open (and create if needed) the snapshot database."""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def get_meta(conn: sqlite3.Connection, key: str) -> Optional[str]:
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row['value'] if row else None
+
+
+def set_meta(conn: sqlite3.Connection, key: str, value: str):
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES (?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, value)
+    )
+
+
+def _summary_hash(listing: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(listing, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _fetch_listing_pages(fetch_json: FetchJson, listings_url: str, executor: ThreadPoolExecutor) -> List[Dict[str, Any]]:
+    """Fetch every listings page; the first page tells us how many to fetch in parallel."""
+    first = fetch_json(f"{listings_url}?page=1&limit={PAGE_SIZE}")
+    if not isinstance(first, dict) or 'data' not in first:
+        raise RuntimeError("Unexpected response from listings service")
+    total_pages = first.get('pagination', {}).get('total_pages', 1)
+    pages = [first]
+    urls = [f"{listings_url}?page={page}&limit={PAGE_SIZE}" for page in range(2, total_pages + 1)]
+    for result in executor.map(fetch_json, urls):
+        if not isinstance(result, dict) or 'data' not in result:
+            raise RuntimeError("Listings page could not be fetched; snapshot left unchanged")
+        pages.append(result)
+    listings = []
+    for page in pages:
+        listings.extend(page['data'])
+    return listings
+
+
+def _sync_touched_listings(fetch_json: FetchJson, sync_url: str, token: Optional[str]) -> Tuple[Optional[set], str]:
+    """
+    Read the change feed from `token`. Returns the IDs of listings with listing or review
+    changes and the token to resume from next time. The IDs are None when there is no
+    token yet or the service asks for a reset; every listing must be re-fetched then.
+    """
+    touched = set()
+    url = f"{sync_url}?since={token}&limit=1000" if token else sync_url
+    while True:
+        result = fetch_json(url)
+        if not isinstance(result, dict) or 'next_token' not in result:
+            raise RuntimeError("Change feed could not be read; snapshot left unchanged")
+        if not token or result.get('reset'):
+            return None, result['next_token']
+        deleted = result.get('deleted', {})
+        touched.update(str(listing.get('_id')) for listing in result.get('listings', []))
+        touched.update(str(review.get('listing_id')) for review in result.get('reviews', []))
+        touched.update(str(review.get('listing_id')) for review in deleted.get('reviews', []))
+        token = result['next_token']
+        if not result.get('has_more'):
+            return touched, token
+        url = f"{sync_url}?since={token}&limit=1000"
+
+
+def _fetch_reviews(fetch_json: FetchJson, reviews_url: str) -> Optional[List[Dict[str, Any]]]:
+    """Fetch all review pages for one listing. Returns None if the listing could not be read."""
+    reviews = []
+    page = 1
+    while True:
+        result = fetch_json(f"{reviews_url}?page={page}&limit={PAGE_SIZE}")
+        if not isinstance(result, dict):
+            return None
+        reviews.extend(result.get('reviews', []))
+        if not result.get('pagination', {}).get('has_next'):
+            return reviews
+        page += 1
+
+
+def take_snapshot(
+    conn: sqlite3.Connection,
+    fetch_json: FetchJson,
+    listings_url: str,
+    listing_base_url: str,
+    users_url: str,
+    sync_url: str,
+    full: bool = False,
+    max_workers: int = MAX_WORKERS,
+) -> Dict[str, Any]:
+    """
+    Pull listings, reviews and users into the snapshot.
+
+    `fetch_json(url)` performs an authenticated GET and returns the decoded body (or
+    None on failure). Unless `full` is set, reviews are only re-fetched for listings
+    whose summary changed or that `sync_url` reports changes for since the previous
+    snapshot. Writes that bypass the listings API (e.g. bulk loads) are not in the
+    change feed; use `full` after those.
+    """
+    started = time.perf_counter()
+    now = datetime.utcnow().isoformat()
+
+    # Read the feed before the listings so writes made during the pull are picked up next time
+    touched, sync_token = _sync_touched_listings(
+        fetch_json, sync_url, None if full else get_meta(conn, 'sync_token')
+    )
+    full = full or touched is None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        users_future = executor.submit(fetch_json, users_url)
+        listings = _fetch_listing_pages(fetch_json, listings_url, executor)
+
+        known = {row['listing_id']: row['content_hash']
+                 for row in conn.execute("SELECT listing_id, content_hash FROM listings")}
+        fresh = {}
+        for listing in listings:
+            listing_id = str(listing.get('_id') or listing.get('listing_id'))
+            fresh[listing_id] = (listing, _summary_hash(listing))
+        changed = [listing_id for listing_id, (_, content_hash) in fresh.items()
+                   if full or listing_id in touched or known.get(listing_id) != content_hash]
+        removed = [listing_id for listing_id in known if listing_id not in fresh]
+
+        review_urls = [f"{listing_base_url}{listing_id}/reviews/" for listing_id in changed]
+        review_results = list(executor.map(lambda url: _fetch_reviews(fetch_json, url), review_urls))
+        users = users_future.result()
+
+    with conn:
+        for listing_id in removed:
+            conn.execute("DELETE FROM reviews WHERE listing_id = ?", (listing_id,))
+            conn.execute("DELETE FROM listings WHERE listing_id = ?", (listing_id,))
+
+        review_count = 0
+        for listing_id, reviews in zip(changed, review_results):
+            listing, content_hash = fresh[listing_id]
+            if reviews is None:
+                # Keep the old reviews but clear the hash so the next refresh retries this listing
+                content_hash = ''
+            conn.execute(
+                "INSERT INTO listings (listing_id, name, price, country, bedrooms, property_type, "
+                "review_scores_rating, picture_url, content_hash, synced_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(listing_id) DO UPDATE SET name = excluded.name, price = excluded.price, "
+                "country = excluded.country, bedrooms = excluded.bedrooms, "
+                "property_type = excluded.property_type, "
+                "review_scores_rating = excluded.review_scores_rating, "
+                "picture_url = excluded.picture_url, content_hash = excluded.content_hash, "
+                "synced_at = excluded.synced_at",
+                (
+                    listing_id,
+                    listing.get('name'),
+                    listing.get('price'),
+                    listing.get('location'),
+                    listing.get('bedrooms'),
+                    listing.get('property_type'),
+                    listing.get('review_scores_rating'),
+                    listing.get('picture_url'),
+                    content_hash,
+                    now,
+                )
+            )
+            if reviews is None:
+                continue
+            conn.execute("DELETE FROM reviews WHERE listing_id = ?", (listing_id,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO reviews (review_id, listing_id, reviewer_id, reviewer_name, comments, date) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        str(review.get('_id', '')),
+                        listing_id,
+                        str(review.get('reviewer_id', '')),
+                        review.get('reviewer_name'),
+                        review.get('comments'),
+                        str(review.get('date', '')),
+                    )
+                    for review in reviews
+                ]
+            )
+            conn.execute(
+                "UPDATE listings SET review_count = ? WHERE listing_id = ?",
+                (len(reviews), listing_id)
+            )
+            review_count += len(reviews)
+
+        if isinstance(users, list):
+            conn.execute("DELETE FROM users")
+            conn.executemany(
+                "INSERT OR REPLACE INTO users (username, email, is_active, is_staff, raw) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        user.get('username'),
+                        user.get('email'),
+                        int(bool(user.get('is_active'))),
+                        int(bool(user.get('is_staff'))),
+                        json.dumps(user, default=str),
+                    )
+                    for user in users if isinstance(user, dict)
+                ]
+            )
+
+        set_meta(conn, 'last_snapshot_at', now)
+        set_meta(conn, 'sync_token', sync_token)
+
+    return {
+        'listings': len(fresh),
+        'refreshed': len(changed),
+        'removed': len(removed),
+        'reviews': review_count,
+        'users': len(users) if isinstance(users, list) else None,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def query_listings(
+    conn: sqlite3.Connection,
+    country: Optional[str] = None,
+    property_type: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_bedrooms: Optional[int] = None,
+    max_reviews: Optional[int] = None,
+    sort_by: Optional[str] = None,
+    limit: int = 50,
+) -> Tuple[List[Dict[str, Any]], float]:
+    """Filter listings in the snapshot. Returns the rows and the elapsed time in ms."""
+    clauses = []
+    params: List[Any] = []
+    if country:
+        clauses.append("country = ? COLLATE NOCASE")
+        params.append(country)
+    if property_type:
+        clauses.append("property_type = ?")
+        params.append(property_type)
+    if min_price is not None:
+        clauses.append("price >= ?")
+        params.append(min_price)
+    if max_price is not None:
+        clauses.append("price <= ?")
+        params.append(max_price)
+    if min_bedrooms is not None:
+        clauses.append("bedrooms >= ?")
+        params.append(min_bedrooms)
+    if max_reviews is not None:
+        clauses.append("review_count <= ?")
+        params.append(max_reviews)
+
+    sql = f"SELECT {', '.join(LISTING_COLUMNS)} FROM listings"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    if sort_by in SORT_OPTIONS:
+        sql += f" ORDER BY {SORT_OPTIONS[sort_by]}"
+    sql += " LIMIT ?"
+    params.append(limit)
+
+    started = time.perf_counter()
+    rows = [dict(row) for row in conn.execute(sql, params)]
+    return rows, (time.perf_counter() - started) * 1000
+
+
+def aggregate_listings(conn: sqlite3.Connection, group_by: str) -> Tuple[List[Dict[str, Any]], float]:
+    """Count, average price/rating and total reviews per `group_by` column."""
+    if group_by not in LISTING_COLUMNS:
+        raise ValueError(f"Cannot group by '{group_by}'")
+    sql = (
+        f"SELECT {group_by}, COUNT(*) AS listings, ROUND(AVG(price), 2) AS avg_price, "
+        f"ROUND(AVG(review_scores_rating), 1) AS avg_rating, SUM(review_count) AS reviews "
+        f"FROM listings GROUP BY {group_by} ORDER BY listings DESC"
+    )
+    started = time.perf_counter()
+    rows = [dict(row) for row in conn.execute(sql)]
+    return rows, (time.perf_counter() - started) * 1000
+
+
+def run_sql(conn: sqlite3.Connection, sql: str) -> Tuple[List[Dict[str, Any]], float]:
+    """Run a read-only SQL statement against the snapshot."""
+    started = time.perf_counter()
+    conn.execute("PRAGMA query_only = ON")
+    try:
+        rows = [dict(row) for row in conn.execute(sql)]
+    finally:
+        conn.execute("PRAGMA query_only = OFF")
+    return rows, (time.perf_counter() - started) * 1000
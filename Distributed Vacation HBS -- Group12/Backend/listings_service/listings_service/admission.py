@@ -0,0 +1,112 @@
+"""
+Admission Control
+
+Per-client rate limiting and load shedding for the Listings Microservice.
+
+- TokenBucketLimiter: token buckets keyed by client and route, refilled at `rate`
+  tokens per second up to `burst`. Requests spend a route-specific cost, so a deep
+  page of `/api/listings/` drains a bucket much faster than a detail read. Bucket
+  state lives in a small SQLite file so every gunicorn worker in the container shares it.
+- ConcurrencyLimiter: per-worker caps on concurrent expensive requests and on
+  concurrent requests per client. Excess requests are rejected immediately instead
+  of occupying every worker thread while well-behaved clients queue behind them.
+"""
+
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Roughly one in this many requests also prunes idle buckets
+CLEANUP_EVERY = 1000
+
+
+class TokenBucketLimiter:
+    def __init__(self, path, rate, burst):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self._local = threading.local()
+
+    def _conn(self):
+        # One connection per thread, opened lazily so it is never shared across a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, cost, scale=1.0):
+        """
+        Spend `cost` tokens from `key`'s bucket, whose rate and burst are multiplied by
+        `scale`. Returns (allowed, retry_after_seconds). Fails open if the shared state
+        cannot be read, so a limiter problem never takes the service down.
+        """
+        now = time.time()
+        rate, burst = self.rate * scale, self.burst * scale
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+                # Tolerate float drift so a bucket holding exactly `cost` is not refused
+                allowed = tokens + 1e-9 >= cost
+                if allowed:
+                    tokens -= cost
+                conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+                if random.randrange(CLEANUP_EVERY) == 0:
+                    # A bucket idle for burst/rate seconds is full again; dropping it changes nothing
+                    conn.execute("DELETE FROM buckets WHERE updated < ?", (now - self.burst / self.rate,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Rate limiter unavailable, admitting request: {e}")
+            return True, 0.0
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+
+class ConcurrencyLimiter:
+    def __init__(self, max_expensive, expensive_cost, max_per_client):
+        self.max_expensive = max_expensive
+        self.expensive_cost = expensive_cost
+        self.max_per_client = max_per_client
+        self._lock = threading.Lock()
+        self._expensive = 0
+        self._per_client = {}
+
+    def acquire(self, client, cost, max_per_client=None):
+        """Returns None if admitted, else 'client' or 'server' naming the cap that was hit."""
+        expensive = cost >= self.expensive_cost
+        if max_per_client is None:
+            max_per_client = self.max_per_client
+        with self._lock:
+            if self._per_client.get(client, 0) >= max_per_client:
+                return 'client'
+            if expensive and self._expensive >= self.max_expensive:
+                return 'server'
+            self._per_client[client] = self._per_client.get(client, 0) + 1
+            if expensive:
+                self._expensive += 1
+        return None
+
+    def release(self, client, cost):
+        with self._lock:
+            remaining = self._per_client.get(client, 0) - 1
+            if remaining > 0:
+                self._per_client[client] = remaining
+            else:
+                self._per_client.pop(client, None)
+            if cost >= self.expensive_cost:
+                self._expensive -= 1
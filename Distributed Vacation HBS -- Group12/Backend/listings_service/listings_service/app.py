@@ -24,10 +24,10 @@ Dependencies:
 - JWT Authentication
 """
 
-from flask import Flask, jsonify, request
-from pymongo import MongoClient
+from flask import Flask, g, jsonify, request, url_for, json as flask_json
+from pymongo import MongoClient, UpdateOne
 from bson.decimal128 import Decimal128
-from datetime import datetime
+from datetime import datetime, timedelta
 import jwt
 import requests
 from functools import wraps
@@ -37,7 +37,17 @@ import logging
 from bson import ObjectId
 from logging.handlers import RotatingFileHandler
 import re
+import hashlib
+import math
+import tempfile
+import time
 from flask_cors import CORS
+from admission import ConcurrencyLimiter, TokenBucketLimiter
+from autocomplete import FIELDS as AUTOCOMPLETE_FIELDS, AutocompleteIndex
+from coalesce import SingleFlight
+from image_cache import DEFAULT_FORMAT as IMAGE_DEFAULT_FORMAT, FORMATS as IMAGE_FORMATS, SIZES as IMAGE_SIZES
+from image_cache import DiskLRUCache, ImageSourceError, fill_cache, raise_cached_failure, variant_key
+from summaries import SUMMARY_PROJECTION, listing_summary
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -64,14 +74,122 @@ try:
     # Test the connection
     client.server_info()
     logger.info("Successfully connected to MongoDB")
-    db = client["sample_airbnb"]
-    homes = db["listingsAndReviews"]
+    db = client[os.getenv('MONGODB_DB', 'sample_airbnb')]
+    homes = db[os.getenv('MONGODB_COLLECTION', 'listingsAndReviews')]
+    # Change log backing the delta-sync API; one entry per listing/review write
+    listing_changes = db["listing_changes"]
+    # Precomputed by build_similar.py, keyed by listing _id
+    similar_listings = db["similar_listings"]
 except Exception as e:
     logger.error(f"Failed to connect to MongoDB: {e}")
     raise
 
+# Delta sync configuration
+SYNC_RETENTION_DAYS = int(os.getenv('SYNC_RETENTION_DAYS', 30))
+# Changes younger than this are not handed out yet, so writes racing in from other
+# workers in the same second can never land behind a token a client already holds
+SYNC_SETTLE_SECONDS = int(os.getenv('SYNC_SETTLE_SECONDS', 2))
+
+try:
+    homes.create_index("updated_at")
+    listing_changes.create_index("ts", expireAfterSeconds=SYNC_RETENTION_DAYS * 24 * 3600)
+except Exception as e:
+    logger.warning(f"Could not ensure sync indexes: {e}")
+
+# Identical concurrent reads share one fetch; set COALESCE_SHARED_DIR to also
+# coalesce across gunicorn workers (e.g. a tmpfs path shared by the container)
+coalescer = SingleFlight(shared_dir=os.getenv('COALESCE_SHARED_DIR') or None)
+
+# Per-worker prefix index for typeahead, built and refreshed off the request path; full
+# builds are shared by the workers of a container through a snapshot file
+autocomplete_index = AutocompleteIndex(
+    homes,
+    refresh_seconds=int(os.getenv('AUTOCOMPLETE_REFRESH_SECONDS', 60)),
+    full_rebuild_seconds=int(os.getenv('AUTOCOMPLETE_FULL_REBUILD_SECONDS', 3600)),
+    snapshot_path=os.getenv('AUTOCOMPLETE_SNAPSHOT_PATH', os.path.join(os.path.dirname(__file__), 'autocomplete_snapshot', 'index.pickle')),
+)
+autocomplete_index.start()
+
+# Thumbnail cache, shared by the workers of a container
+image_cache = DiskLRUCache(
+    os.getenv('IMAGE_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'image_cache')),
+    max_bytes=int(os.getenv('IMAGE_CACHE_MAX_MB', 512)) * 1024 * 1024,
+    max_age_seconds=int(os.getenv('IMAGE_CACHE_MAX_AGE_SECONDS', 7 * 24 * 3600)),
+)
+# Failed source fetches are remembered this long so dead picture URLs don't tie up request threads
+IMAGE_FAILURE_TTL_SECONDS = int(os.getenv('IMAGE_FAILURE_TTL_SECONDS', 300))
+
+# Admission control: token buckets per client and route, shared by the workers of a
+# container through a SQLite file, plus per-worker caps on concurrent requests
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+# Use the first X-Forwarded-For hop as the client IP; only enable behind a trusted proxy
+RATE_LIMIT_TRUST_PROXY = os.getenv('RATE_LIMIT_TRUST_PROXY', 'false').lower() == 'true'
+rate_limiter = TokenBucketLimiter(
+    os.getenv('RATE_LIMIT_DB', os.path.join(tempfile.gettempdir(), 'listings-rate-limit.sqlite3')),
+    rate=float(os.getenv('RATE_LIMIT_RATE', 10)),
+    burst=float(os.getenv('RATE_LIMIT_BURST', 40)),
+)
+concurrency_limiter = ConcurrencyLimiter(
+    max_expensive=int(os.getenv('ADMISSION_MAX_EXPENSIVE', 2)),
+    expensive_cost=float(os.getenv('ADMISSION_EXPENSIVE_COST', 5)),
+    max_per_client=int(os.getenv('ADMISSION_MAX_PER_CLIENT', 2)),
+)
+# Staff and superusers (the Admin CLI and its snapshot job) get larger buckets and more
+# concurrent requests
+RATE_LIMIT_ADMIN_MULTIPLIER = float(os.getenv('RATE_LIMIT_ADMIN_MULTIPLIER', 10))
+ADMISSION_MAX_PER_ADMIN = int(os.getenv('ADMISSION_MAX_PER_ADMIN', 8))
+# Endpoints outside the per-client concurrency cap: list screens load many thumbnails at once
+CONCURRENCY_EXEMPT = {'get_listing_image'}
+# Token cost per request, by endpoint; paged endpoints are priced by depth in request_cost()
+ROUTE_COSTS = {
+    'autocomplete': 0.2,
+    'get_listing_image': 0.5,
+    'add_review': 2,
+    'update_review': 2,
+    'delete_review': 2,
+    'sync_changes': 2,
+    'bulk_moderate_reviews': 10,
+}
+MAX_REQUEST_COST = 20
+
 # Auth service configuration
 AUTH_SERVICE_URL = os.getenv('AUTH_SERVICE_URL', 'http://auth-service:8000')
+# Verify-token answers are reused this long, so admission control and token_required
+# don't cost an auth-service call per request; also bounds how late a revocation is seen
+AUTH_CACHE_SECONDS = int(os.getenv('AUTH_CACHE_SECONDS', 60))
+AUTH_CACHE_MAX_ENTRIES = 10000
+verified_tokens = {}
+
+def cached_token_user(token):
+    """Verify-token response for `token` if a fresh one is cached, else None. Never calls the auth service."""
+    cached = verified_tokens.get(hashlib.sha256(token.encode('utf-8')).hexdigest())
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    return None
+
+def verify_token(token):
+    """Verify-token response for `token`, or None if the auth service rejects it."""
+    key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    cached = verified_tokens.get(key)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    try:
+        auth_response = requests.get(
+            f'{AUTH_SERVICE_URL}/api/auth/verify-token/',
+            headers={'Authorization': token},
+            timeout=5
+        )
+        if auth_response.status_code >= 500:
+            return None  # Auth service trouble; don't remember it as a bad token
+        data = auth_response.json() if auth_response.status_code == 200 else None
+    except Exception:
+        return None
+    if not isinstance(data, dict) or 'user_id' not in data:
+        data = None
+    if len(verified_tokens) >= AUTH_CACHE_MAX_ENTRIES:
+        verified_tokens.clear()
+    verified_tokens[key] = (time.monotonic() + AUTH_CACHE_SECONDS, data)
+    return data
 
 def token_required(f):
     @wraps(f)
@@ -79,20 +197,122 @@ def token_required(f):
         token = request.headers.get('Authorization')
         if not token:
             return jsonify({'message': 'Token is missing!'}), 401
-        try:
-            # Verify token with auth service
-            auth_response = requests.get(
-                f'{AUTH_SERVICE_URL}/api/auth/verify-token/',
-                headers={'Authorization': token}
-            )
-            if auth_response.status_code != 200:
-                return jsonify({'message': 'Token is invalid!'}), 401
-            data = auth_response.json()
-            return f(data['user_id'], *args, **kwargs)
-        except:
+        data = verify_token(token)
+        if data is None:
             return jsonify({'message': 'Token is invalid!'}), 401
+        # Full verify-token response, for checks beyond the user ID (see admin_required)
+        g.auth_user = data
+        return f(data['user_id'], *args, **kwargs)
     return decorated
 
+def is_admin(user):
+    return bool(user.get('is_staff') or user.get('is_superuser'))
+
+def admin_required(f):
+    """token_required, plus `is_staff` or `is_superuser` set in the verify-token response."""
+    @token_required
+    @wraps(f)
+    def decorated(user_id, *args, **kwargs):
+        if not is_admin(g.auth_user):
+            return jsonify({'message': 'Admin privileges required!'}), 403
+        return f(user_id, *args, **kwargs)
+    return decorated
+
+def record_changes(changes):
+    """Append review writes, given as (listing_id, op, review_id) tuples, to the change log read by /api/sync/."""
+    if not changes:
+        return
+    now = datetime.utcnow()
+    try:
+        listing_changes.insert_many([
+            {"kind": "review", "op": op, "listing_id": listing_id, "review_id": review_id, "ts": now}
+            for listing_id, op, review_id in changes
+        ], ordered=False)
+    except Exception as e:
+        logger.error(f"Failed to record {len(changes)} change(s): {e}")
+
+def record_change(listing_id, op, review_id):
+    record_changes([(listing_id, op, review_id)])
+
+def owned_review(review_id, user_id):
+    """Match a review by ID and owner; reviewer_id may be stored as a string or a number."""
+    return {"_id": review_id, "reviewer_id": {"$in": list({str(user_id), user_id})}}
+
+def review_write_failed(listing_id, review_id, action):
+    # Only reached when the conditional write matched nothing: tell "missing" from "not yours"
+    if homes.count_documents({"_id": listing_id, "reviews._id": review_id}, limit=1):
+        return jsonify({"error": f"Unauthorized to {action} this review"}), 403
+    return jsonify({"error": "Review not found"}), 404
+
+def coalesced_response(key, fetch):
+    """Run `fetch() -> (payload, status)` once for all concurrent requests with `key`."""
+    def render():
+        payload, status = fetch()
+        return flask_json.dumps(payload).encode('utf-8'), status
+    body, status = coalescer.do(key, render)
+    return app.response_class(body, status=status, mimetype='application/json')
+
+def client_ip():
+    forwarded = request.headers.get('X-Forwarded-For') if RATE_LIMIT_TRUST_PROXY else None
+    if forwarded:
+        return forwarded.split(',')[0].strip()
+    return request.remote_addr
+
+def request_cost():
+    endpoint = request.endpoint
+    if endpoint in ('list_listings', 'get_host_listings', 'get_listing_reviews'):
+        # MongoDB walks every skipped row, so deep pages are priced by how far they reach
+        page = max(request.args.get('page', 1, type=int), 1)
+        limit = max(min(request.args.get('limit', 10, type=int), 100), 1)
+        return min(1 + page * limit / 200, MAX_REQUEST_COST)
+    return ROUTE_COSTS.get(endpoint, 1)
+
+def rejected(message, status, retry_after):
+    response = jsonify({"error": message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+@app.before_request
+def admit_request():
+    if not RATE_LIMIT_ENABLED or request.method == 'OPTIONS' or request.endpoint is None:
+        return None
+    cost = request_cost()
+    token = request.headers.get('Authorization')
+    user = cached_token_user(token) if token else None
+    if user is None:
+        # Callers without an already verified token pay from their IP's bucket, so made-up
+        # tokens can neither open fresh buckets nor force an auth-service call each
+        client = f'ip:{client_ip()}'
+        allowed, retry_after = rate_limiter.take(f'{client}|{request.endpoint}', cost)
+        if not allowed:
+            return rejected("Rate limit exceeded", 429, retry_after)
+        user = verify_token(token) if token else None
+    max_per_client = None
+    if user is not None:
+        client = f"user:{user['user_id']}"
+        scale = 1.0
+        if is_admin(user):
+            scale, max_per_client = RATE_LIMIT_ADMIN_MULTIPLIER, ADMISSION_MAX_PER_ADMIN
+        allowed, retry_after = rate_limiter.take(f'{client}|{request.endpoint}', cost, scale)
+        if not allowed:
+            return rejected("Rate limit exceeded", 429, retry_after)
+    if request.endpoint in CONCURRENCY_EXEMPT:
+        return None
+    refused = concurrency_limiter.acquire(client, cost, max_per_client)
+    if refused == 'client':
+        return rejected("Too many concurrent requests", 429, 1)
+    if refused == 'server':
+        return rejected("Service busy, please retry", 503, 1)
+    request.environ['listings.admission'] = (client, cost)
+    return None
+
+@app.teardown_request
+def release_request(exc):
+    admitted = request.environ.pop('listings.admission', None)
+    if admitted is not None:
+        concurrency_limiter.release(*admitted)
+
 def make_serializable(obj):
     if isinstance(obj, Decimal128):
         return float(obj.to_decimal())
@@ -157,23 +377,10 @@ def list_listings():
             cursor = cursor.sort(sort_criteria)
         cursor = cursor.skip(skip).limit(limit)
         
-        results = []
-        for listing in cursor:
-            summary = {}
-            summary['_id'] = str(listing.get('_id', ''))
-            summary['listing_id'] = str(listing.get('listing_id', summary['_id']))
-            summary['name'] = listing.get('name', '')
-            summary['price'] = float(listing['price'].to_decimal()) if isinstance(listing.get('price'), Decimal128) else listing.get('price', 0)
-            # Always provide a picture_url field
-            picture_url = listing.get('thumbnail_url') or listing.get('picture_url')
-            if not picture_url and 'images' in listing and isinstance(listing['images'], dict):
-                picture_url = listing['images'].get('picture_url')
-            summary['picture_url'] = picture_url or None
-            summary['location'] = listing.get('address', {}).get('country', '')
-            summary['bedrooms'] = listing.get('bedrooms', 0)
-            summary['property_type'] = listing.get('property_type', '')
-            summary['review_scores_rating'] = listing.get('review_scores_rating', None)
-            results.append(summary)
+        results = [listing_summary(listing) for listing in cursor]
+        for summary in results:
+            # Small cached rendition for list rows; picture_url stays the full-size original
+            summary['thumbnail_url'] = url_for('get_listing_image', listing_id=summary['_id'], _external=True) if summary['picture_url'] else None
         
         logger.info(f"Returning processed listings: {results}")
         
@@ -197,6 +404,9 @@ def list_listings():
 # GET a single listing by ID
 @app.route('/api/listing/<listing_id>/', methods=['GET'])
 def get_listing(listing_id):
+    return coalesced_response(('listing', listing_id), lambda: fetch_listing(listing_id))
+
+def fetch_listing(listing_id):
     try:
         logger.info(f"🔍 Requested ID: {listing_id}")
         # Exclude reviews from the result
@@ -213,12 +423,89 @@ def get_listing(listing_id):
                     listing['house_rules'] = ""
                 else:
                     listing['house_rules'] = str(listing['house_rules'])
-            return jsonify({"success": True, "data": listing, "message": None})
-        return jsonify({"error": "Listing not found"}), 404
+            return {"success": True, "data": listing, "message": None}, 200
+        return {"error": "Listing not found"}, 404
     except Exception as e:
         logger.error(f"Error in get_listing: {e}")
+        return {"error": "Internal server error"}, 500
+
+# GET typeahead suggestions from the in-memory prefix index
+@app.route('/api/autocomplete/', methods=['GET'])
+def autocomplete():
+    field = request.args.get('field', 'name')
+    query = request.args.get('q', '')
+    limit = max(1, request.args.get('limit', 10, type=int))
+    if field not in AUTOCOMPLETE_FIELDS:
+        return jsonify({"error": f"'field' must be one of: {', '.join(AUTOCOMPLETE_FIELDS)}"}), 400
+    if not autocomplete_index.ready:
+        return jsonify({"success": True, "ready": False, "suggestions": []})
+    suggestions = autocomplete_index.search(field, query, limit)
+    return jsonify({
+        "success": True,
+        "ready": True,
+        "suggestions": [{"value": value, "popularity": score} for value, score in suggestions]
+    })
+
+# GET precomputed similar listings
+@app.route('/api/listing/<listing_id>/similar/', methods=['GET'])
+def get_similar_listings(listing_id):
+    try:
+        limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+        similar = similar_listings.find_one(
+            {"_id": listing_id},
+            {"similar": {"$slice": limit}, "built_at": 1}
+        )
+        if not similar:
+            return jsonify({"success": True, "data": [], "message": "No similar listings computed yet"})
+        return jsonify({
+            "success": True,
+            "data": similar.get("similar", []),
+            "built_at": similar["built_at"].isoformat() if similar.get("built_at") else None,
+            "message": None
+        })
+    except Exception as e:
+        logger.error(f"Error in get_similar_listings: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+# GET a resized listing picture from the thumbnail cache
+@app.route('/api/listing/<listing_id>/image/', methods=['GET'])
+def get_listing_image(listing_id):
+    size = request.args.get('size', 'thumb')
+    fmt = request.args.get('format', IMAGE_DEFAULT_FORMAT)
+    if size not in IMAGE_SIZES or fmt not in IMAGE_FORMATS:
+        return jsonify({"error": f"'size' must be one of {sorted(IMAGE_SIZES)} and 'format' one of {sorted(IMAGE_FORMATS)}"}), 400
+    try:
+        cached = image_cache.get(variant_key(listing_id, size, fmt))
+        if cached is None:
+            # Concurrent misses for the same listing share one origin fetch
+            coalescer.do(('image', listing_id, fmt), lambda: cache_listing_image(listing_id, fmt))
+            cached = image_cache.get(variant_key(listing_id, size, fmt))
+        if cached is None:
+            return jsonify({"error": "Listing not found"}), 404
+        body, etag, mimetype = cached
+        response = app.response_class(body, mimetype=mimetype)
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = 86400
+        return response.make_conditional(request)
+    except ImageSourceError as e:
+        logger.warning(f"Image for listing {listing_id} unavailable: {e}")
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        logger.error(f"Error in get_listing_image: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+def cache_listing_image(listing_id, fmt):
+    # Checked here, inside the coalesced call, so waiters behind a failed fetch see the failure
+    raise_cached_failure(image_cache, listing_id)
+    listing = homes.find_one({"listing_id": listing_id}, SUMMARY_PROJECTION)
+    if not listing:
+        listing = homes.find_one({"_id": listing_id}, SUMMARY_PROJECTION)
+    if not listing:
+        return b'', 404
+    fill_cache(image_cache, listing_id, listing_summary(listing)['picture_url'], fmt, failure_ttl=IMAGE_FAILURE_TTL_SECONDS)
+    return b'', 200
+
 # GET host information
 @app.route('/api/host/<host_id>/', methods=['GET'])
 def get_host(host_id):
@@ -294,18 +581,24 @@ def add_review(user_id, listing_id):
             if field not in review:
                 return jsonify({"error": f"'{field}' is required"}), 400
 
+        now = datetime.utcnow()
         review['_id'] = str(review['_id'])
         review['reviewer_id'] = str(review['reviewer_id'])
-        review['date'] = datetime.utcnow()
+        review['date'] = now
+        review['updated_at'] = now
         review['listing_id'] = listing_id
 
+        # Only push if this review ID is not there yet, so client retries are idempotent
         result = homes.update_one(
-            {"_id": listing_id},
-            {"$push": {"reviews": review}}
+            {"_id": listing_id, "reviews._id": {"$ne": review['_id']}},
+            {"$push": {"reviews": review}, "$set": {"updated_at": now}}
         )
 
         if result.modified_count == 1:
+            record_change(listing_id, "upsert", review['_id'])
             return jsonify({"message": "Review added"}), 201
+        if homes.count_documents({"_id": listing_id}, limit=1):
+            return jsonify({"message": "Review already exists"}), 200
         return jsonify({"error": "Listing not found"}), 404
     except Exception as e:
         logger.error(f"Error in add_review: {e}")
@@ -316,37 +609,30 @@ def add_review(user_id, listing_id):
 @token_required
 def update_review(user_id, listing_id, review_id):
     try:
-        # First verify the review belongs to the user
-        listing = homes.find_one(
-            {"_id": listing_id, "reviews._id": review_id},
-            {"reviews.$": 1}
-        )
-        0
-
-        if not listing or not listing.get('reviews'):
-            return jsonify({"error": "Review not found"}), 404
-            
-        if str(listing['reviews'][0]['reviewer_id']) != str(user_id):
-            return jsonify({"error": "Unauthorized to update this review"}), 403
-
         update = request.json
         updates = {}
 
         if "comments" in update:
-            updates["reviews.$.comments"] = update["comments"]
+            updates["reviews.$[review].comments"] = update["comments"]
         if "reviewer_name" in update:
-            updates["reviews.$.reviewer_name"] = update["reviewer_name"]
+            updates["reviews.$[review].reviewer_name"] = update["reviewer_name"]
 
-        updates["reviews.$.updated_at"] = datetime.utcnow()
+        now = datetime.utcnow()
+        updates["reviews.$[review].updated_at"] = now
+        updates["updated_at"] = now
 
+        # Ownership check and update in one atomic operation
+        review_filter = owned_review(review_id, user_id)
         result = homes.update_one(
-            {"_id": listing_id, "reviews._id": review_id},
-            {"$set": updates}
+            {"_id": listing_id, "reviews": {"$elemMatch": review_filter}},
+            {"$set": updates},
+            array_filters=[{f"review.{field}": value for field, value in review_filter.items()}]
         )
 
-        if result.modified_count == 1:
+        if result.matched_count == 1:
+            record_change(listing_id, "upsert", review_id)
             return jsonify({"message": "Review updated"}), 200
-        return jsonify({"error": "Review not found"}), 404
+        return review_write_failed(listing_id, review_id, "update")
     except Exception as e:
         logger.error(f"Error in update_review: {e}")
         return jsonify({"error": "Internal server error"}), 500
@@ -356,36 +642,125 @@ def update_review(user_id, listing_id, review_id):
 @token_required
 def delete_review(user_id, listing_id, review_id):
     try:
-        # First verify the review belongs to the user
-        listing = homes.find_one(
-            {"_id": listing_id, "reviews._id": review_id},
-            {"reviews.$": 1}
-        )
-        
-        if not listing or not listing.get('reviews'):
-            return jsonify({"error": "Review not found"}), 404
-            
-        if str(listing['reviews'][0]['reviewer_id']) != str(user_id):
-            return jsonify({"error": "Unauthorized to delete this review"}), 403
-
+        # Ownership check and delete in one atomic operation
+        review_filter = owned_review(review_id, user_id)
         result = homes.update_one(
-            {"_id": listing_id},
-            {"$pull": {"reviews": {"_id": review_id}}}
+            {"_id": listing_id, "reviews": {"$elemMatch": review_filter}},
+            {"$pull": {"reviews": review_filter}, "$set": {"updated_at": datetime.utcnow()}}
         )
         if result.modified_count == 1:
+            record_change(listing_id, "delete", review_id)
             return jsonify({"message": "Review deleted"}), 200
-        return jsonify({"error": "Review not found"}), 404
+        return review_write_failed(listing_id, review_id, "delete")
     except Exception as e:
         logger.error(f"Error in delete_review: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+# Reviews moderated per bulk_write call
+BULK_MODERATION_BATCH_SIZE = 1000
+
+# POST bulk review moderation (admin only)
+@app.route('/admin/reviews/bulk/', methods=['POST'])
+@admin_required
+def bulk_moderate_reviews(user_id):
+    try:
+        operations = (request.json or {}).get('operations')
+        if not isinstance(operations, list) or not operations:
+            return jsonify({"error": "'operations' must be a non-empty list"}), 400
+
+        # Group by listing: all deletes for a listing collapse into a single $pull
+        deletes = {}
+        edits = []
+        errors = []
+        for index, op in enumerate(operations):
+            if not isinstance(op, dict) or not op.get('listing_id') or not op.get('review_id'):
+                errors.append({"index": index, "error": "'listing_id' and 'review_id' are required"})
+                continue
+            listing_id, review_id = str(op['listing_id']), str(op['review_id'])
+            if op.get('action') == 'delete':
+                deletes.setdefault(listing_id, set()).add(review_id)
+            elif op.get('action') == 'update':
+                fields = {field: op[field] for field in ('comments', 'reviewer_name') if field in op}
+                if not fields:
+                    errors.append({"index": index, "error": "'update' needs 'comments' or 'reviewer_name'"})
+                    continue
+                edits.append((listing_id, review_id, fields))
+            else:
+                errors.append({"index": index, "error": "'action' must be 'delete' or 'update'"})
+
+        # bulk_write only reports totals, so read which targeted reviews exist up front and
+        # log changes for those alone; sync must not send tombstones for reviews that never were
+        targets = {}
+        for listing_id, review_ids in deletes.items():
+            targets.setdefault(listing_id, set()).update(review_ids)
+        for listing_id, review_id, _ in edits:
+            targets.setdefault(listing_id, set()).add(review_id)
+        existing = set()
+        for listing in homes.find({"_id": {"$in": list(targets)}}, {"reviews._id": 1}):
+            review_ids = {review.get("_id") for review in listing.get("reviews") or []}
+            existing.update((listing["_id"], review_id) for review_id in targets[listing["_id"]] & review_ids)
+
+        now = datetime.utcnow()
+        requests_by_listing = []
+        changes = []
+        for listing_id, review_ids in deletes.items():
+            requests_by_listing.append((listing_id, UpdateOne(
+                {"_id": listing_id},
+                {"$pull": {"reviews": {"_id": {"$in": sorted(review_ids)}}}, "$set": {"updated_at": now}}
+            )))
+            changes.extend(
+                (listing_id, "delete", review_id) for review_id in review_ids
+                if (listing_id, review_id) in existing
+            )
+        for listing_id, review_id, fields in edits:
+            if review_id in deletes.get(listing_id, ()):
+                continue
+            updates = {f"reviews.$[review].{field}": value for field, value in fields.items()}
+            updates["reviews.$[review].updated_at"] = now
+            updates["updated_at"] = now
+            requests_by_listing.append((listing_id, UpdateOne(
+                {"_id": listing_id, "reviews._id": review_id},
+                {"$set": updates},
+                array_filters=[{"review._id": review_id}]
+            )))
+            if (listing_id, review_id) in existing:
+                changes.append((listing_id, "upsert", review_id))
+        # Keep each listing's writes together so a batch touches as few documents as possible
+        requests_by_listing.sort(key=lambda item: item[0])
+        write_requests = [write for _, write in requests_by_listing]
+
+        matched = modified = 0
+        for start in range(0, len(write_requests), BULK_MODERATION_BATCH_SIZE):
+            result = homes.bulk_write(write_requests[start:start + BULK_MODERATION_BATCH_SIZE], ordered=False)
+            matched += result.matched_count
+            modified += result.modified_count
+        record_changes(changes)
+
+        logger.info(f"Admin {user_id} moderated reviews: {len(write_requests)} writes, {modified} modified")
+        return jsonify({
+            "message": "Moderation applied",
+            "requested": len(operations),
+            "writes": len(write_requests),
+            "matched": matched,
+            "modified": modified,
+            "errors": errors,
+        }), 200
+    except Exception as e:
+        logger.error(f"Error in bulk_moderate_reviews: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
 # GET listing reviews
 @app.route('/api/listing/<listing_id>/reviews/', methods=['GET'])
 def get_listing_reviews(listing_id):
+    page = request.args.get('page', 1, type=int)
+    limit = min(request.args.get('limit', 10, type=int), 100)
+    return coalesced_response(
+        ('reviews', listing_id, page, limit),
+        lambda: fetch_listing_reviews(listing_id, page, limit)
+    )
+
+def fetch_listing_reviews(listing_id, page, limit):
     try:
-        page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 10, type=int)
-        limit = min(limit, 100)
         skip = (page - 1) * limit
 
         # Find the listing and only return the reviews field
@@ -416,10 +791,127 @@ def get_listing_reviews(listing_id):
                 'has_next': page < total_pages,
                 'has_prev': page > 1
             }
-            return jsonify({"success": True, "reviews": paginated_reviews, "pagination": pagination})
-        return jsonify({"success": True, "reviews": [], "pagination": {}})  # Return empty if no reviews
+            return {"success": True, "reviews": paginated_reviews, "pagination": pagination}, 200
+        return {"success": True, "reviews": [], "pagination": {}}, 200  # Return empty if no reviews
     except Exception as e:
         logger.error(f"Error in get_listing_reviews: {e}")
+        return {"error": "Internal server error"}, 500
+
+def parse_sync_token(since):
+    """Accept either a resume token returned by /api/sync/ or an ISO-8601 watermark."""
+    if ObjectId.is_valid(since):
+        return ObjectId(since)
+    watermark = datetime.fromisoformat(since.replace('Z', '+00:00'))
+    if watermark.tzinfo is not None:
+        watermark = watermark.replace(tzinfo=None) - (watermark.utcoffset() or timedelta(0))
+    # Smallest ObjectId of the *next* second, so the whole watermark second counts as seen
+    return ObjectId.from_datetime(watermark.replace(microsecond=0) + timedelta(seconds=1))
+
+def token_time(token):
+    return token.generation_time.replace(tzinfo=None)
+
+# GET listing and review changes since a resume token
+@app.route('/api/sync/', methods=['GET'])
+def sync_changes():
+    try:
+        since = request.args.get('since')
+        limit = max(1, min(request.args.get('limit', 500, type=int), 1000))
+        now = datetime.utcnow()
+        settled = ObjectId.from_datetime(now - timedelta(seconds=SYNC_SETTLE_SECONDS))
+        empty = {"listings": [], "reviews": [], "deleted": {"listings": [], "reviews": []}}
+
+        def reset():
+            return jsonify({"success": True, "reset": True, "next_token": str(settled), "has_more": False, **empty})
+
+        if not since:
+            # Bootstrap: the client loads the normal list endpoints, then syncs from here
+            return reset()
+        try:
+            token = parse_sync_token(since)
+        except ValueError:
+            return jsonify({"error": "'since' must be a sync token or ISO-8601 timestamp"}), 400
+        if token_time(token) < now - timedelta(days=SYNC_RETENTION_DAYS):
+            # Older changes may have expired from the log; the client must refetch everything
+            return reset()
+        if token_time(token) > now:
+            # Never issued by us (e.g. a device clock running ahead); what the client holds is unknown
+            return reset()
+        # Tokens from another replica whose clock is slightly ahead only resend a few changes
+        token = min(token, settled)
+
+        entries = list(listing_changes.find(
+            {"_id": {"$gt": token, "$lt": settled}}
+        ).sort("_id", 1).limit(limit + 1))
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+        next_token = entries[-1]["_id"] if has_more else settled
+
+        # Listing writes are found through `updated_at`, over whole seconds: this page covers
+        # [second of `token`, second of `next_token`) and the next page starts where it ends
+        changed = list(homes.find(
+            {"updated_at": {"$gte": token_time(token), "$lt": token_time(next_token)}},
+            {**SUMMARY_PROJECTION, "updated_at": 1},
+        ).sort("updated_at", 1).limit(limit + 1))
+        if len(changed) > limit:
+            cut = changed[limit]["updated_at"].replace(microsecond=0)
+            if cut <= token_time(token):
+                # More than `limit` listings written within one second (a bulk load)
+                return reset()
+            next_token = ObjectId.from_datetime(cut)
+            has_more = True
+            entries = [entry for entry in entries if entry["_id"] < next_token]
+            changed = [listing for listing in changed if listing["updated_at"] < cut]
+        listings = [listing_summary(listing) for listing in changed]
+
+        # Collapse the log so each review is reported once, in its latest state
+        review_ops = {}
+        for entry in entries:
+            review_ops[(entry["listing_id"], entry["review_id"])] = entry
+        logged_ids = {listing_id for listing_id, _ in review_ops}
+        existing = {listing["_id"] for listing in homes.find({"_id": {"$in": list(logged_ids)}}, {"_id": 1})} if logged_ids else set()
+        deleted_listings = [{"listing_id": listing_id, "deleted_at": None} for listing_id in logged_ids - existing]
+
+        deleted_reviews = [
+            {"listing_id": listing_id, "review_id": review_id, "deleted_at": entry["ts"].isoformat()}
+            for (listing_id, review_id), entry in review_ops.items() if entry["op"] == "delete"
+        ]
+        wanted = {}
+        for (listing_id, review_id), entry in review_ops.items():
+            if entry["op"] != "delete":
+                wanted.setdefault(listing_id, []).append(review_id)
+        reviews = []
+        if wanted:
+            pipeline = [
+                {"$match": {"_id": {"$in": list(wanted)}}},
+                {"$project": {"reviews": {"$filter": {
+                    "input": "$reviews",
+                    "as": "review",
+                    "cond": {"$in": ["$$review._id", sorted({rid for ids in wanted.values() for rid in ids})]},
+                }}}},
+            ]
+            for listing in homes.aggregate(pipeline):
+                for review in listing.get("reviews") or []:
+                    if review["_id"] in wanted[listing["_id"]]:
+                        review.setdefault("listing_id", listing["_id"])
+                        reviews.append(make_serializable(review))
+            found = {(review["listing_id"], review["_id"]) for review in reviews}
+            deleted_reviews.extend(
+                {"listing_id": listing_id, "review_id": review_id, "deleted_at": None}
+                for listing_id, review_ids in wanted.items() for review_id in review_ids
+                if (listing_id, review_id) not in found
+            )
+
+        return jsonify({
+            "success": True,
+            "reset": False,
+            "listings": listings,
+            "reviews": reviews,
+            "deleted": {"listings": deleted_listings, "reviews": deleted_reviews},
+            "next_token": str(next_token),
+            "has_more": has_more,
+        })
+    except Exception as e:
+        logger.error(f"Error in sync_changes: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 if __name__ == '__main__':
@@ -0,0 +1,281 @@
+"""
+Autocomplete Index
+
+In-memory prefix index behind `/api/autocomplete/`. Each gunicorn worker keeps, per
+field (listing name, country, market, property type), a sorted array of normalized
+terms with their popularity. Lookups are a binary search plus a top-N over the
+matching range; every prefix whose range is longer than `SCAN_LIMIT` has its top-N
+precomputed, so no lookup ranks more than `SCAN_LIMIT` terms. No database query is
+made per keystroke.
+
+The index is built from one projected scan and refreshed in a background thread:
+listings whose `updated_at` moved since the last refresh are re-read and only the
+fields whose terms actually changed are rebuilt. A periodic full rebuild picks up
+deletions.
+
+With a `snapshot_path`, full builds happen once per container rather than once per
+worker: the first worker to need one scans the collection (under a file lock) and
+pickles the result, and the others, including workers restarted by gunicorn's
+`--max-requests`, load that snapshot and catch up with an incremental refresh. Since
+unpickling runs code, the snapshot directory is created private to the service user and
+snapshots owned by anyone else, or writable by them, are ignored.
+"""
+
+import heapq
+import logging
+import os
+import pickle
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; every worker builds its own index there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAX_SUGGESTIONS = 10
+# Ranges at most this long are ranked on the fly; longer ones are precomputed
+SCAN_LIMIT = 1000
+
+FIELDS = ('name', 'country', 'market', 'property_type')
+PROJECTION = {
+    "name": 1, "address.country": 1, "address.market": 1, "property_type": 1,
+    "number_of_reviews": 1, "updated_at": 1,
+}
+
+
+def normalize(text):
+    """Lower-case, strip accents and collapse whitespace so 'São Paulo' matches 'sao p'."""
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().split())
+
+
+def listing_terms(listing):
+    """(name, country, market, property_type, name popularity) for one listing."""
+    address = listing.get('address') or {}
+    return (
+        listing.get('name') or None,
+        address.get('country') or None,
+        address.get('market') or None,
+        listing.get('property_type') or None,
+        int(listing.get('number_of_reviews') or 0),
+    )
+
+
+class PrefixIndex:
+    """Immutable sorted-array index for one field."""
+
+    def __init__(self, popularity):
+        # Values that normalize to '' (e.g. whitespace-only names) can never be suggested
+        entries = sorted(
+            (key, value, score) for key, value, score in
+            ((normalize(value), value, score) for value, score in popularity.items())
+            if key and score > 0
+        )
+        self.keys = [key for key, _, _ in entries]
+        self.values = [value for _, value, _ in entries]
+        self.scores = [score for _, _, score in entries]
+        self.top = {}
+        if len(self.keys) > SCAN_LIMIT:
+            self._precompute()
+
+    def _range(self, prefix, start=0):
+        if not prefix:
+            return start, len(self.keys)
+        # Smallest string greater than every string starting with `prefix`
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return bisect_left(self.keys, prefix, start), bisect_left(self.keys, upper, start)
+
+    def _precompute(self):
+        # Breadth-first over prefix lengths, only descending into ranges still too long to scan
+        ranges = [(0, len(self.keys))]
+        length = 0
+        while ranges:
+            longer = []
+            for start, stop in ranges:
+                while start < stop:
+                    prefix = self.keys[start][:length]
+                    if len(prefix) < length:
+                        # Shorter than the prefixes of this pass; its range would swallow theirs
+                        start += 1
+                        continue
+                    start, end = self._range(prefix, start)
+                    if end - start > SCAN_LIMIT:
+                        self.top[prefix] = self._rank(start, end, MAX_SUGGESTIONS)
+                        longer.append((start, end))
+                    start = max(end, start + 1)
+            ranges = longer
+            length += 1
+
+    def _rank(self, start, end, limit):
+        best = heapq.nlargest(limit, range(start, end), key=self.scores.__getitem__)
+        return [(self.values[i], self.scores[i]) for i in best]
+
+    def search(self, prefix, limit=MAX_SUGGESTIONS):
+        if prefix in self.top:
+            return self.top[prefix][:limit]
+        return self._rank(*self._range(prefix), limit)
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class AutocompleteIndex:
+    def __init__(self, collection, refresh_seconds=60, full_rebuild_seconds=3600, snapshot_path=None):
+        self.collection = collection
+        self.refresh_seconds = refresh_seconds
+        self.full_rebuild_seconds = full_rebuild_seconds
+        self.snapshot_path = snapshot_path if fcntl is not None else None
+        if self.snapshot_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.snapshot_path)), mode=0o700, exist_ok=True)
+        self.indexes = {}
+        self.ready = False
+        self._terms = {}
+        self._popularity = {}
+        self._watermark = None
+        self._last_full_build = 0.0
+
+    def start(self):
+        """Build in a background thread and keep refreshing; requests never wait on it."""
+        thread = threading.Thread(target=self._run, name='autocomplete-index', daemon=True)
+        thread.start()
+        return thread
+
+    def _run(self):
+        while True:
+            try:
+                if not self.ready or time.monotonic() - self._last_full_build > self.full_rebuild_seconds:
+                    self.load_or_build()
+                else:
+                    self.refresh()
+            except Exception as e:
+                logger.error(f"Autocomplete index refresh failed: {e}")
+            time.sleep(self.refresh_seconds)
+
+    def build(self):
+        started = time.perf_counter()
+        scan_started_at = datetime.utcnow()
+        terms = {}
+        for listing in self.collection.find({}, PROJECTION):
+            terms[listing['_id']] = listing_terms(listing)
+        popularity = {field: {} for field in FIELDS}
+        for entry in terms.values():
+            self._add(popularity, entry, 1)
+        self._terms = terms
+        self._popularity = popularity
+        self.indexes = {field: PrefixIndex(popularity[field]) for field in FIELDS}
+        self._watermark = scan_started_at
+        self._last_full_build = time.monotonic()
+        self.ready = True
+        logger.info(f"Autocomplete index built from {len(terms):,} listings in {time.perf_counter() - started:.2f}s")
+
+    def load_or_build(self):
+        """Load the shared snapshot if it is recent enough, else build the index and share it."""
+        if not self.snapshot_path:
+            self.build()
+            return
+        with open(self.snapshot_path + '.lock', 'a+b') as lock_file:
+            # Workers starting together wait here for the first one's build instead of scanning too
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                loaded = self._load_snapshot()
+                if not loaded:
+                    self.build()
+                    self._save_snapshot()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        if loaded:
+            self.refresh()
+
+    def _load_snapshot(self):
+        started = time.perf_counter()
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                if st.st_uid != os.getuid() or st.st_mode & 0o022:
+                    logger.warning(f"Ignoring autocomplete snapshot not private to this user: {self.snapshot_path}")
+                    return False
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable autocomplete snapshot: {e}")
+            return False
+        age = time.time() - snapshot['built_at']
+        if snapshot['source'] != self.collection.full_name or age > self.full_rebuild_seconds:
+            return False
+        self._terms = snapshot['terms']
+        self._popularity = snapshot['popularity']
+        self.indexes = snapshot['indexes']
+        self._watermark = snapshot['watermark']
+        self._last_full_build = time.monotonic() - age
+        self.ready = True
+        logger.info(f"Autocomplete index loaded from snapshot in {time.perf_counter() - started:.2f}s")
+        return True
+
+    def _save_snapshot(self):
+        snapshot = {
+            'source': self.collection.full_name,
+            'built_at': time.time(),
+            'watermark': self._watermark,
+            'terms': self._terms,
+            'popularity': self._popularity,
+            'indexes': self.indexes,
+        }
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        try:
+            with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            logger.warning(f"Could not write autocomplete snapshot: {e}")
+
+    def refresh(self):
+        """Re-read listings updated since the last refresh and rebuild only the fields that changed."""
+        scan_started_at = datetime.utcnow()
+        dirty = set()
+        for listing in self.collection.find({"updated_at": {"$gt": self._watermark}}, PROJECTION):
+            new = listing_terms(listing)
+            old = self._terms.get(listing['_id'])
+            if old == new:
+                continue
+            if old is not None:
+                self._add(self._popularity, old, -1)
+            self._add(self._popularity, new, 1)
+            self._terms[listing['_id']] = new
+            dirty.update(field for field, before, after in zip(FIELDS, old or (None,) * 5, new) if before != after)
+            if old is None or old[4] != new[4]:
+                dirty.add('name')
+        for field in dirty:
+            self.indexes = dict(self.indexes, **{field: PrefixIndex(self._popularity[field])})
+        self._watermark = scan_started_at
+
+    @staticmethod
+    def _add(popularity, terms, sign):
+        name, country, market, property_type, reviews = terms
+        # Names rank by review count (+1 so unreviewed listings still appear);
+        # the other fields rank by how many listings carry the value
+        for field, value, weight in (
+            ('name', name, reviews + 1),
+            ('country', country, 1),
+            ('market', market, 1),
+            ('property_type', property_type, 1),
+        ):
+            if value is None:
+                continue
+            counts = popularity[field]
+            counts[value] = counts.get(value, 0) + sign * weight
+            if counts[value] <= 0:
+                del counts[value]
+
+    def search(self, field, query, limit=MAX_SUGGESTIONS):
+        index = self.indexes.get(field)
+        if index is None:
+            return []
+        return index.search(normalize(query), min(limit, MAX_SUGGESTIONS))
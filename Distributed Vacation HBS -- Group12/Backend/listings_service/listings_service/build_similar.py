@@ -0,0 +1,506 @@
+"""
+Similar Listings Batch Job
+
+Precomputes the "similar homes" shown on the listing detail screen so that
+`GET /api/listing/<id>/similar/` is a single indexed lookup.
+
+- Each listing becomes a feature vector built from price, bedrooms, property type,
+  amenities, location and rating (standardized, weighted and L2-normalized). The
+  scaling is fitted on full builds and stored in `batch_jobs` for incremental runs.
+- Top-K neighbours by cosine similarity are computed with vectorized NumPy matrix
+  products in memory-bounded chunks. Neighbours are searched within the same country.
+- Results are stored in the `similar_listings` collection with denormalized listing
+  summaries. Incremental runs only recompute listings that changed since the last
+  run, listings whose stored neighbours changed, and listings a changed listing now
+  outranks.
+
+Usage:
+    python build_similar.py build            # incremental (full on first run)
+    python build_similar.py build --full
+    python build_similar.py benchmark --count 1000000
+"""
+
+import argparse
+import logging
+import os
+import resource
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from itertools import chain, islice, repeat
+
+import numpy as np
+from bson.decimal128 import Decimal128
+from pymongo import MongoClient, ReplaceOne
+
+from summaries import SUMMARY_PROJECTION, listing_summary
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+logger = logging.getLogger(__name__)
+
+TOP_K = int(os.getenv('SIMILAR_TOP_K', 10))
+# Upper bound on the similarity block held in memory at once (bytes)
+CHUNK_BYTES = int(os.getenv('SIMILAR_CHUNK_BYTES', 256 * 1024 * 1024))
+MAX_PROPERTY_TYPES = 24
+LOCATION_SCALE_KM = 25.0
+MAX_AMENITIES = 64
+WRITE_BATCH_SIZE = 1000
+READ_BATCH_SIZE = 10000
+JOB_NAME = 'similar_listings'
+
+# Relative weight of each feature group in the cosine similarity
+WEIGHTS = {
+    'price': 2.0,
+    'bedrooms': 1.5,
+    'rating': 0.5,
+    'property_type': 1.5,
+    'amenities': 1.0,
+    'location': 3.0,
+}
+
+FEATURE_PROJECTION = {
+    "price": 1, "bedrooms": 1, "property_type": 1, "amenities": 1, "updated_at": 1,
+    "address.country": 1, "address.location.coordinates": 1,
+    "review_scores.review_scores_rating": 1, "review_scores_rating": 1,
+}
+
+
+def _to_float(value, default=np.nan):
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class ListingColumns:
+    """Raw per-listing columns pulled from one projected scan."""
+
+    def __init__(self, ids, country, price, bedrooms, rating, property_type, amenities, lon, lat, updated_at):
+        self.ids = ids
+        self.country = country
+        self.price = price
+        self.bedrooms = bedrooms
+        self.rating = rating
+        self.property_type = property_type
+        self.amenities = amenities
+        self.lon = lon
+        self.lat = lat
+        self.updated_at = updated_at
+
+    @classmethod
+    def from_documents(cls, documents):
+        ids, country, price, bedrooms, rating = [], [], [], [], []
+        property_type, amenities, lon, lat, updated_at = [], [], [], [], []
+        for doc in documents:
+            address = doc.get('address') or {}
+            coordinates = (address.get('location') or {}).get('coordinates') or [np.nan, np.nan]
+            scores = doc.get('review_scores') or {}
+            ids.append(str(doc['_id']))
+            country.append(address.get('country') or '')
+            price.append(_to_float(doc.get('price')))
+            bedrooms.append(_to_float(doc.get('bedrooms')))
+            rating.append(_to_float(scores.get('review_scores_rating', doc.get('review_scores_rating'))))
+            property_type.append(doc.get('property_type') or '')
+            amenities.append(doc.get('amenities') or [])
+            lon.append(_to_float(coordinates[0]))
+            lat.append(_to_float(coordinates[1]))
+            updated_at.append(doc.get('updated_at'))
+        return cls(
+            np.array(ids, dtype=object), np.array(country, dtype=object),
+            np.array(price, dtype=np.float64), np.array(bedrooms, dtype=np.float64),
+            np.array(rating, dtype=np.float64), np.array(property_type, dtype=object),
+            amenities, np.array(lon, dtype=np.float64), np.array(lat, dtype=np.float64),
+            updated_at,
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _fit_scale(values):
+    """(fill, mean, std) for `_scale`, or None when every value is missing."""
+    missing = np.isnan(values)
+    if missing.all():
+        return None
+    fill = float(np.nanmedian(values))
+    values = np.where(missing, fill, values)
+    std = float(values.std())
+    return fill, float(values.mean()), std if std > 0 else 1.0
+
+
+def _scale(values, params):
+    if params is None:
+        return np.zeros(len(values), dtype=np.float32)
+    fill, mean, std = params
+    values = np.where(np.isnan(values), fill, values)
+    return ((values - mean) / std).astype(np.float32)
+
+
+def _fit_vocabulary(labels, max_labels):
+    """The `max_labels` most frequent of `labels`."""
+    counts = Counter(labels)
+    # Ties break on the label so every full build picks the same vocabulary
+    return sorted(counts, key=lambda label: (-counts[label], str(label)))[:max_labels]
+
+
+def _encode(labels, vocabulary, count):
+    columns = {label: i for i, label in enumerate(vocabulary)}
+    return np.fromiter(map(columns.get, labels, repeat(-1)), dtype=np.int64, count=count)
+
+
+def _one_hot(labels, vocabulary):
+    cols = _encode(labels, vocabulary, len(labels))
+    rows = np.flatnonzero(cols >= 0)
+    matrix = np.zeros((len(labels), len(vocabulary)), dtype=np.float32)
+    matrix[rows, cols[rows]] = 1.0
+    return matrix
+
+
+def _multi_hot(lists, vocabulary):
+    lengths = np.fromiter(map(len, lists), dtype=np.int64, count=len(lists))
+    rows = np.repeat(np.arange(len(lists)), lengths)
+    cols = _encode(chain.from_iterable(lists), vocabulary, int(lengths.sum()))
+    known = cols >= 0
+    matrix = np.zeros((len(lists), len(vocabulary)), dtype=np.float32)
+    matrix[rows[known], cols[known]] = 1.0
+    return matrix
+
+
+class FeatureModel:
+    """
+    Feature scaling fitted on a full scan: numeric means and deviations, the property
+    type and amenity vocabularies, amenity IDF weights and per-country centroids.
+    Incremental runs reuse the model of the last full build, so their similarities are
+    comparable with the `min_score` values stored by it.
+    """
+
+    def __init__(self, price, bedrooms, rating, property_types, amenities, amenity_idf, centroids):
+        self.price = price
+        self.bedrooms = bedrooms
+        self.rating = rating
+        self.property_types = property_types
+        self.amenities = amenities
+        self.amenity_idf = amenity_idf
+        self.centroids = centroids
+
+    @staticmethod
+    def _numeric(columns):
+        return (
+            np.log1p(np.clip(columns.price, 0, None)),
+            np.clip(columns.bedrooms, 0, 10),
+            columns.rating,
+        )
+
+    @classmethod
+    def fit(cls, columns):
+        price, bedrooms, rating = cls._numeric(columns)
+        property_types = _fit_vocabulary(columns.property_type, MAX_PROPERTY_TYPES)
+        amenities = _fit_vocabulary(chain.from_iterable(columns.amenities), MAX_AMENITIES)
+        # Idf-style weighting so ubiquitous amenities (Wifi, Essentials) matter less
+        frequency = _multi_hot(columns.amenities, amenities).sum(axis=0)
+        amenity_idf = [float(np.log((1 + len(columns)) / (1 + df))) for df in frequency]
+        # Country centroids are fitted by the first transform that sees the country
+        return cls(_fit_scale(price), _fit_scale(bedrooms), _fit_scale(rating),
+                   property_types, amenities, amenity_idf, {})
+
+    def add_centroids(self, columns):
+        """Fit centroids for countries the model has not seen; existing ones are kept."""
+        countries, country = np.unique(columns.country, return_inverse=True)
+        counts = np.bincount(country)
+        lon = np.bincount(country, np.nan_to_num(columns.lon)) / counts
+        lat = np.bincount(country, np.nan_to_num(columns.lat)) / counts
+        for i, name in enumerate(countries):
+            self.centroids.setdefault(name, (float(lon[i]), float(lat[i])))
+        return countries, country
+
+    def transform(self, columns):
+        """Return an (n, d) float32 matrix of L2-normalized feature vectors."""
+        countries, country = self.add_centroids(columns)
+        price, bedrooms, rating = self._numeric(columns)
+        # Neighbours are only searched within a country, so location is the east/north offset
+        # from the country's centroid, in units of LOCATION_SCALE_KM
+        lon = np.nan_to_num(columns.lon)
+        lat = np.nan_to_num(columns.lat)
+        centres = np.array([self.centroids[name] for name in countries], dtype=np.float64).reshape(-1, 2)[country]
+        east = (lon - centres[:, 0]) * 111.32 * np.cos(np.radians(lat))
+        north = (lat - centres[:, 1]) * 110.57
+        location = np.clip(np.stack([east, north], axis=1) / LOCATION_SCALE_KM, -4, 4)
+        amenities = _multi_hot(columns.amenities, self.amenities) * np.array(self.amenity_idf, dtype=np.float32)
+        norms = np.linalg.norm(amenities, axis=1, keepdims=True)
+        np.divide(amenities, norms, out=amenities, where=norms > 0)
+        parts = [
+            WEIGHTS['price'] * _scale(price, self.price)[:, None],
+            WEIGHTS['bedrooms'] * _scale(bedrooms, self.bedrooms)[:, None],
+            WEIGHTS['rating'] * _scale(rating, self.rating)[:, None],
+            WEIGHTS['property_type'] * _one_hot(columns.property_type, self.property_types),
+            WEIGHTS['amenities'] * amenities,
+            WEIGHTS['location'] * location.astype(np.float32),
+        ]
+        features = np.hstack(parts).astype(np.float32)
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        np.divide(features, norms, out=features, where=norms > 0)
+        return features
+
+    def to_document(self):
+        return {
+            'price': self.price, 'bedrooms': self.bedrooms, 'rating': self.rating,
+            'property_types': self.property_types,
+            'amenities': self.amenities, 'amenity_idf': self.amenity_idf,
+            # A list rather than a sub-document: country names may contain '.'
+            'centroids': [[country, lon, lat] for country, (lon, lat) in self.centroids.items()],
+        }
+
+    @classmethod
+    def from_document(cls, doc):
+        return cls(
+            doc['price'], doc['bedrooms'], doc['rating'], doc['property_types'],
+            doc['amenities'], doc['amenity_idf'],
+            {country: (lon, lat) for country, lon, lat in doc['centroids']},
+        )
+
+
+def build_features(columns):
+    """Fit a FeatureModel on `columns` and return their feature matrix."""
+    return FeatureModel.fit(columns).transform(columns)
+
+
+def top_k_neighbours(features, rows=None, k=TOP_K, chunk_bytes=CHUNK_BYTES):
+    """
+    Top-k cosine neighbours (excluding self) for `rows` of `features` (all rows by
+    default). Returns (indices, scores), each of shape (len(rows), k), best first.
+    """
+    n = len(features)
+    rows = np.arange(n) if rows is None else np.asarray(rows)
+    k = min(k, n - 1)
+    indices = np.empty((len(rows), max(k, 0)), dtype=np.int64)
+    scores = np.empty((len(rows), max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return indices, scores
+    # Each block holds float32 similarities plus the int64 indices argpartition returns
+    chunk = max(1, chunk_bytes // (12 * n))
+    for start in range(0, len(rows), chunk):
+        block_rows = rows[start:start + chunk]
+        distance = features[block_rows] @ features.T
+        np.negative(distance, out=distance)
+        distance[np.arange(len(block_rows)), block_rows] = np.inf
+        best = np.argpartition(distance, k - 1, axis=1)[:, :k]
+        best_distance = np.take_along_axis(distance, best, axis=1)
+        order = np.argsort(best_distance, axis=1)
+        indices[start:start + len(block_rows)] = np.take_along_axis(best, order, axis=1)
+        scores[start:start + len(block_rows)] = -np.take_along_axis(best_distance, order, axis=1)
+    return indices, scores
+
+
+def outranked_rows(features, changed, min_scores, chunk_bytes=CHUNK_BYTES):
+    """Rows whose stored k-th score is beaten by one of the `changed` rows."""
+    if len(changed) == 0:
+        return np.array([], dtype=np.int64)
+    hits = []
+    chunk = max(1, chunk_bytes // (4 * len(changed)))
+    changed_features = features[changed].T
+    for start in range(0, len(features), chunk):
+        similarity = features[start:start + chunk] @ changed_features
+        # A row never outranks itself
+        own = np.flatnonzero((changed >= start) & (changed < start + chunk))
+        similarity[changed[own] - start, own] = -np.inf
+        beaten = similarity.max(axis=1) > min_scores[start:start + chunk]
+        hits.append(start + np.flatnonzero(beaten))
+    return np.concatenate(hits)
+
+
+def country_buckets(columns):
+    order = np.argsort(columns.country, kind='stable')
+    countries, starts = np.unique(columns.country[order], return_index=True)
+    return dict(zip(countries, np.split(order, starts[1:])))
+
+
+def fetch_summaries(homes, ids):
+    """Listing summaries by ID, read in batches so no query nears the 16 MB document limit."""
+    summaries = {}
+    ids = list(ids)
+    for start in range(0, len(ids), READ_BATCH_SIZE):
+        for listing in homes.find({'_id': {'$in': ids[start:start + READ_BATCH_SIZE]}}, SUMMARY_PROJECTION):
+            summaries[str(listing['_id'])] = listing_summary(listing)
+    return summaries
+
+
+def neighbour_writes(bucket_ids, rows, indices, scores, summaries, country, built_at):
+    """One `similar_listings` replacement per recomputed row."""
+    for row, neighbour_rows, neighbour_scores in zip(rows, indices, scores):
+        neighbours = [
+            dict(summaries[bucket_ids[i]], score=round(float(score), 4))
+            for i, score in zip(neighbour_rows, neighbour_scores) if bucket_ids[i] in summaries
+        ]
+        yield ReplaceOne({'_id': bucket_ids[row]}, {
+            'similar': neighbours,
+            'min_score': float(neighbour_scores[-1]) if len(neighbour_scores) else -1.0,
+            'country': country,
+            'built_at': built_at,
+        }, upsert=True)
+
+
+def build_similar(db, collection_name, full=False, k=TOP_K):
+    homes = db[collection_name]
+    similar = db['similar_listings']
+    jobs = db['batch_jobs']
+    started = time.perf_counter()
+    run_started_at = datetime.utcnow()
+
+    state = jobs.find_one({'_id': JOB_NAME}) or {}
+    # Incremental runs need the scaling the stored neighbour scores were computed with
+    watermark = None if full or 'model' not in state else state.get('watermark')
+    columns = ListingColumns.from_documents(homes.find({}, FEATURE_PROJECTION))
+    logger.info(f"Scanned {len(columns):,} listings in {time.perf_counter() - started:.1f}s")
+    model = FeatureModel.fit(columns) if watermark is None else FeatureModel.from_document(state['model'])
+    features = model.transform(columns)
+
+    # Full builds only need the stored IDs, to delete the entries of removed listings
+    stored = {}
+    for doc in similar.find({}, {'_id': 1} if watermark is None else {'min_score': 1, 'similar._id': 1}):
+        stored[doc['_id']] = (doc.get('min_score', -1.0), [n['_id'] for n in doc.get('similar', [])])
+
+    all_ids = set(columns.ids)
+    removed = [listing_id for listing_id in stored if listing_id not in all_ids]
+    if watermark is None:
+        changed_ids = all_ids
+    else:
+        changed_ids = {
+            listing_id for listing_id, updated_at in zip(columns.ids, columns.updated_at)
+            if listing_id not in stored or (updated_at is not None and updated_at > watermark)
+        }
+    # Neighbour lists that mention a changed or removed listing are stale too
+    touched = changed_ids | set(removed)
+    stale_ids = {listing_id for listing_id, (_, neighbours) in stored.items() if touched.intersection(neighbours)}
+
+    operations = []
+    recomputed = 0
+    for country, bucket in country_buckets(columns).items():
+        bucket_ids = columns.ids[bucket]
+        bucket_features = features[bucket]
+        is_changed = np.fromiter((i in changed_ids for i in bucket_ids), dtype=bool, count=len(bucket))
+        if watermark is None:
+            rows = np.arange(len(bucket))
+        else:
+            is_stale = np.fromiter((i in stale_ids for i in bucket_ids), dtype=bool, count=len(bucket))
+            min_scores = np.array([stored.get(i, (np.inf,))[0] for i in bucket_ids], dtype=np.float32)
+            outranked = outranked_rows(bucket_features, np.flatnonzero(is_changed), min_scores)
+            rows = np.union1d(np.flatnonzero(is_changed | is_stale), outranked)
+        if len(rows) == 0:
+            continue
+        indices, scores = top_k_neighbours(bucket_features, rows, k)
+        # Neighbours come from the same country, so summaries are only kept for this bucket
+        summaries = fetch_summaries(homes, bucket_ids[np.unique(indices)])
+        for operation in neighbour_writes(bucket_ids, rows, indices, scores, summaries, country, run_started_at):
+            operations.append(operation)
+            if len(operations) >= WRITE_BATCH_SIZE:
+                similar.bulk_write(operations, ordered=False)
+                operations = []
+        recomputed += len(rows)
+        logger.info(f"{country or '(no country)'}: {len(rows):,} of {len(bucket):,} listings recomputed")
+
+    if operations:
+        similar.bulk_write(operations, ordered=False)
+    for start in range(0, len(removed), READ_BATCH_SIZE):
+        similar.delete_many({'_id': {'$in': removed[start:start + READ_BATCH_SIZE]}})
+    similar.create_index('similar._id')
+    jobs.update_one({'_id': JOB_NAME}, {'$set': {'watermark': run_started_at, 'model': model.to_document()}}, upsert=True)
+    elapsed = time.perf_counter() - started
+    logger.info(f"Recomputed {recomputed:,} listings, removed {len(removed):,} in {elapsed:.1f}s")
+    return {'listings': len(columns), 'recomputed': recomputed, 'removed': len(removed), 'seconds': elapsed}
+
+
+def synthetic_columns(count, countries=9, seed=0):
+    """Vectorized stand-in for a listings scan, used by the benchmark."""
+    rng = np.random.default_rng(seed)
+    country = rng.integers(0, countries, count)
+    centres = rng.uniform([-60, -180], [60, 180], size=(countries, 2))
+    amenity_pool = [f"amenity-{i}" for i in range(80)]
+    amenity_counts = rng.integers(5, 30, count)
+    amenity_choices = rng.integers(0, len(amenity_pool), amenity_counts.sum())
+    amenities = np.split(np.array(amenity_pool, dtype=object)[amenity_choices], np.cumsum(amenity_counts)[:-1])
+    return ListingColumns(
+        ids=np.array([str(i) for i in range(count)], dtype=object),
+        country=np.array([f"country-{c}" for c in country], dtype=object),
+        price=rng.lognormal(4.5, 0.7, count),
+        bedrooms=np.minimum(rng.poisson(1.3, count), 10).astype(np.float64),
+        rating=np.where(rng.random(count) < 0.2, np.nan, rng.integers(60, 101, count)).astype(np.float64),
+        property_type=np.array([f"type-{t}" for t in rng.zipf(1.6, count) % 30], dtype=object),
+        amenities=[list(a) for a in amenities],
+        lon=centres[country, 1] + rng.normal(0, 0.1, count),
+        lat=centres[country, 0] + rng.normal(0, 0.1, count),
+        updated_at=[None] * count,
+    )
+
+
+def synthetic_summaries(columns, rows):
+    return {
+        columns.ids[row]: listing_summary({
+            '_id': columns.ids[row], 'name': f"Synthetic listing {columns.ids[row]}",
+            'price': float(columns.price[row]), 'bedrooms': float(columns.bedrooms[row]),
+            'property_type': columns.property_type[row], 'address': {'country': columns.country[row]},
+            'images': {'picture_url': f"https://example.com/pictures/{columns.ids[row]}.jpg"},
+        })
+        for row in rows
+    }
+
+
+def benchmark(count, countries, k):
+    def peak_rss_mb():
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    started = time.perf_counter()
+    columns = synthetic_columns(count, countries)
+    logger.info(f"Generated {count:,} synthetic listings in {time.perf_counter() - started:.1f}s "
+                f"(peak RSS {peak_rss_mb():,.0f} MB)")
+
+    started = time.perf_counter()
+    features = build_features(columns)
+    logger.info(f"Built {features.shape[0]:,} x {features.shape[1]} features ({features.nbytes / 2 ** 20:,.0f} MB) "
+                f"in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    built_at = datetime.utcnow()
+    for country, bucket in country_buckets(columns).items():
+        bucket_ids = columns.ids[bucket]
+        indices, scores = top_k_neighbours(features[bucket], k=k)
+        # Same summary and write-batch work as `build`, minus the MongoDB round trips
+        summaries = synthetic_summaries(columns, bucket[np.unique(indices)])
+        writes = neighbour_writes(bucket_ids, np.arange(len(bucket)), indices, scores, summaries, country, built_at)
+        while list(islice(writes, WRITE_BATCH_SIZE)):
+            pass
+    elapsed = time.perf_counter() - started
+    logger.info(f"Top-{k} neighbours and summaries for {count:,} listings in {countries} countries: {elapsed:.1f}s "
+                f"({count / elapsed:,.0f} listings/s, chunk budget {CHUNK_BYTES / 2 ** 20:,.0f} MB, "
+                f"peak RSS {peak_rss_mb():,.0f} MB)")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Precompute similar listings")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="Build or incrementally refresh similar_listings")
+    build.add_argument('--uri', default=os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    build.add_argument('--db', default=os.getenv('MONGODB_DB', 'sample_airbnb'))
+    build.add_argument('--collection', default=os.getenv('MONGODB_COLLECTION', 'listingsAndReviews'))
+    build.add_argument('--full', action='store_true', help="Recompute every listing")
+    build.add_argument('--k', type=int, default=TOP_K)
+    bench = commands.add_parser('benchmark', help="Measure build time and memory on synthetic data")
+    bench.add_argument('--count', type=int, default=1000000)
+    bench.add_argument('--countries', type=int, default=9)
+    bench.add_argument('--k', type=int, default=TOP_K)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    if args.command == 'benchmark':
+        benchmark(args.count, args.countries, args.k)
+        return
+    client = MongoClient(args.uri)
+    build_similar(client[args.db], args.collection, full=args.full, k=args.k)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Request Coalescing
+
+Single-flight helper for the Listings Microservice. Concurrent identical reads (same
+route, same normalized parameters) share one database fetch and one serialization;
+every waiter receives the same rendered response.
+
+- Within a worker, the first request for a key runs the fetch while the others wait on
+  it (this needs a threaded worker, e.g. gunicorn `--threads`).
+- Across workers (optional), a per-key byte-range lock on a file in `shared_dir` lets
+  one process fetch while the others block on the lock and then read the result it
+  wrote. A result is only reused by requests that arrived before it was written, i.e.
+  that were already waiting; it is never served as a cache to later requests.
+"""
+
+import errno
+import hashlib
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; cross-worker coalescing is disabled there
+    fcntl = None
+
+# Number of result files used for cross-worker coalescing; locks are per key
+SHARED_STRIPES = 1024
+# Keys are locked at an offset in this range of the lock file
+LOCK_RANGE = 2 ** 31
+_HEADER = struct.Struct('!dHI')  # written_at, status, key length
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, shared_dir=None):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._lock_fd = None
+        self._lock_fd_pid = None
+        self.shared_dir = shared_dir if fcntl is not None else None
+        if self.shared_dir:
+            os.makedirs(self.shared_dir, exist_ok=True)
+
+    def do(self, key, fn):
+        """
+        Return `fn()` for `key`, sharing the call with concurrent callers of the same key.
+        `fn` must return a `(body_bytes, status)` tuple.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._shared(key, fn) if self.shared_dir else fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _shared_lock_fd(self):
+        # Record locks belong to the process and closing *any* descriptor of the file drops
+        # them all, so each process keeps a single descriptor open (reopened after a fork)
+        with self._lock:
+            if self._lock_fd_pid != os.getpid():
+                self._lock_fd = os.open(os.path.join(self.shared_dir, 'locks'), os.O_RDWR | os.O_CREAT, 0o644)
+                self._lock_fd_pid = os.getpid()
+            return self._lock_fd
+
+    def _shared(self, key, fn):
+        arrived_at = time.time()
+        key_bytes = repr(key).encode('utf-8')
+        digest = int.from_bytes(hashlib.sha1(key_bytes).digest()[:8], 'big')
+        path = os.path.join(self.shared_dir, f"{digest % SHARED_STRIPES:04d}.res")
+        offset = digest % LOCK_RANGE
+        fd = self._shared_lock_fd()
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX, 1, offset)
+        except OSError as e:
+            # The kernel tracks record locks per process, so threads of two workers waiting
+            # on each other's keys can look like a deadlock; just fetch without coalescing
+            if e.errno != errno.EDEADLK:
+                raise
+            return fn()
+        try:
+            cached = self._read_result(path, key_bytes, arrived_at)
+            if cached is not None:
+                return cached
+            body, status = fn()
+            if status < 500:
+                self._write_result(path, key_bytes, body, status)
+            return body, status
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN, 1, offset)
+
+    def _read_result(self, path, key_bytes, arrived_at):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if len(data) < _HEADER.size:
+            return None
+        written_at, status, key_length = _HEADER.unpack_from(data)
+        if written_at < arrived_at:
+            # Written before this request arrived; it may predate a write the client just made
+            return None
+        start = _HEADER.size
+        if data[start:start + key_length] != key_bytes:
+            return None
+        return data[start + key_length:], status
+
+    def _write_result(self, path, key_bytes, body, status):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(time.time(), status, len(key_bytes)))
+            f.write(key_bytes)
+            f.write(body)
+        os.replace(tmp_path, path)
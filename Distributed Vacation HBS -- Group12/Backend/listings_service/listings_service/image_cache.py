@@ -0,0 +1,209 @@
+"""
+Image Thumbnails
+
+Thumbnail proxy support for the Listings Microservice. Listing pictures live on
+external hosts at full size; this module fetches a source image once, renders every
+fixed-size variant from it (WebP, with JPEG as a fallback), and keeps the results in a
+size-bounded on-disk LRU cache shared by the workers of a container.
+
+Cache entries are single files: a small header (content-hash ETag, MIME type, write
+time and optional max age) followed by the encoded image. Hits bump the file's mtime;
+when the cache grows past its limit, the least recently used files are deleted.
+
+Failed source fetches are cached too, for a short time, so a listing with a dead or
+slow picture costs one origin timeout per TTL rather than one per request.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+# Longest edge, in pixels, of each variant
+SIZES = {
+    'thumb': 320,
+    'medium': 800,
+}
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+DEFAULT_FORMAT = 'webp' if features.check('webp') else 'jpeg'
+# Refuse to download or decode sources larger than this
+MAX_SOURCE_BYTES = 25 * 1024 * 1024
+Image.MAX_IMAGE_PIXELS = 50_000_000
+FAILURE_MIMETYPE = 'application/x-image-source-error'
+
+
+class ImageSourceError(Exception):
+    """The source image could not be fetched or decoded."""
+
+    def __init__(self, message, status=502):
+        super().__init__(message)
+        self.status = status
+
+
+class DiskLRUCache:
+    # Every worker of a container writes to the same directory, so each process re-measures
+    # it after writing this fraction of the limit; overshoot stays below workers * fraction
+    RESCAN_FRACTION = 0.02
+
+    def __init__(self, directory, max_bytes, max_age_seconds):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._size = None
+        self._unscanned = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        """Return (body, etag, mimetype) or None if missing or expired."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                etag, mimetype, written_at, *max_age = f.readline().decode('ascii').split()
+                body = f.read()
+            max_age = float(max_age[0]) if max_age else self.max_age_seconds
+        except (OSError, ValueError):
+            return None
+        if time.time() - float(written_at) > max_age:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return body, etag, mimetype
+
+    def set(self, key, body, mimetype, max_age_seconds=None):
+        """Store `body`; `max_age_seconds` overrides the cache-wide max age for this entry."""
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        header = f"{etag} {mimetype} {time.time():.3f}"
+        if max_age_seconds is not None:
+            header += f" {max_age_seconds}"
+        header = (header + "\n").encode('ascii')
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(body)
+        os.replace(tmp_path, path)
+        written = len(header) + len(body)
+        self._unscanned += written
+        if self._size is None or self._unscanned >= self.max_bytes * self.RESCAN_FRACTION:
+            self._size = self._scan_size()
+            self._unscanned = 0
+        else:
+            self._size += written
+        if self._size > self.max_bytes:
+            self.evict()
+        return etag
+
+    def _scan_size(self):
+        total = 0
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.is_file():
+                    total += entry.stat().st_size
+            except FileNotFoundError:  # Evicted by another worker mid-scan
+                continue
+        return total
+
+    def evict(self):
+        """Delete least recently used entries until the cache is at 90% of its limit."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            except FileNotFoundError:
+                continue
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._size = total
+
+
+def variant_key(listing_id, size, fmt):
+    return f"{listing_id}:{size}:{fmt}"
+
+
+def fetch_source(url, timeout=10):
+    if not url or not url.startswith(('http://', 'https://')):
+        raise ImageSourceError("Listing has no picture", status=404)
+    try:
+        with requests.get(url, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data.extend(chunk)
+                if len(data) > MAX_SOURCE_BYTES:
+                    raise ImageSourceError("Source image too large")
+            return bytes(data)
+    except requests.exceptions.RequestException as e:
+        raise ImageSourceError(f"Could not fetch source image: {e}")
+
+
+def render_variants(source, fmt):
+    """Render every size in SIZES from the source bytes; returns {size: body}."""
+    pil_format, _ = FORMATS[fmt]
+    try:
+        image = Image.open(io.BytesIO(source))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ImageSourceError(f"Could not decode source image: {e}")
+    variants = {}
+    for size, edge in SIZES.items():
+        variant = image.copy()
+        variant.thumbnail((edge, edge), Image.LANCZOS)
+        out = io.BytesIO()
+        if pil_format == 'WEBP':
+            variant.save(out, pil_format, quality=80, method=4)
+        else:
+            variant.save(out, pil_format, quality=80, optimize=True, progressive=True)
+        variants[size] = out.getvalue()
+    return variants
+
+
+def failure_key(listing_id):
+    return f"{listing_id}:failure"
+
+
+def raise_cached_failure(cache, listing_id):
+    """Re-raise a recent source failure for the listing without contacting the origin."""
+    cached = cache.get(failure_key(listing_id))
+    if cached is not None:
+        failure = json.loads(cached[0])
+        raise ImageSourceError(failure['message'], status=failure['status'])
+
+
+def fill_cache(cache, listing_id, url, fmt, failure_ttl=300):
+    """Fetch the listing's source image once and cache all of its variants."""
+    try:
+        variants = render_variants(fetch_source(url), fmt)
+    except ImageSourceError as e:
+        failure = json.dumps({'message': str(e), 'status': e.status}).encode('utf-8')
+        cache.set(failure_key(listing_id), failure, FAILURE_MIMETYPE, max_age_seconds=failure_ttl)
+        raise
+    _, mimetype = FORMATS[fmt]
+    for size, body in variants.items():
+        cache.set(variant_key(listing_id, size, fmt), body, mimetype)
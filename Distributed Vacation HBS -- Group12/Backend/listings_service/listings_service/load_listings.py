@@ -0,0 +1,385 @@
+"""
+Listings Bulk Loader
+
+Command-line tool for standing up the listings collection in any MongoDB target:
+- `load`: stream a `listingsAndReviews` dump (mongoexport JSON lines, a JSON array or
+  mongodump BSON, optionally gzipped) into the target without reading it whole
+- `generate`: produce synthetic listings shaped like `sample_airbnb.listingsAndReviews`
+  with configurable review-array sizes, either into MongoDB or to a JSON lines file
+
+Documents are inserted with parallel unordered `insert_many` batches and the indexes
+used by the listings service are built after the load. Throughput is reported as the
+load runs.
+
+Usage:
+    python load_listings.py load dump.json.gz --uri mongodb://localhost:27017 --drop
+    python load_listings.py generate --count 1000000 --reviews-mean 15 --uri mongodb://localhost:27017
+    python load_listings.py generate --count 10000 --output fixture.jsonl
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import bson
+from bson import json_util
+from bson.decimal128 import Decimal128
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo.errors import BulkWriteError
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB = os.getenv('MONGODB_DB', 'sample_airbnb')
+DEFAULT_COLLECTION = os.getenv('MONGODB_COLLECTION', 'listingsAndReviews')
+
+# Indexes backing the listings service queries; built once the data is in place
+LISTING_INDEXES = [
+    ([("listing_id", ASCENDING)], {}),
+    ([("host.host_id", ASCENDING)], {}),
+    ([("address.country", ASCENDING)], {}),
+    ([("property_type", ASCENDING)], {}),
+    ([("price", ASCENDING)], {}),
+    ([("bedrooms", ASCENDING)], {}),
+    ([("review_scores_rating", DESCENDING)], {}),
+    ([("calendar_last_scraped", DESCENDING)], {}),
+    ([("updated_at", ASCENDING)], {}),
+]
+
+READ_CHUNK_SIZE = 1 << 20
+
+
+def open_dump(path, mode='rb'):
+    encoding = 'utf-8' if 't' in mode else None
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding=encoding)
+    return open(path, mode.replace('t', ''), encoding=encoding)
+
+
+def iter_bson(path):
+    with open_dump(path) as f:
+        yield from bson.decode_file_iter(f)
+
+
+def iter_json(path):
+    """
+    Stream documents from JSON lines or a top-level JSON array, reading the file in
+    chunks. Extended JSON (`$oid`, `$date`, `$numberDecimal`, ...) is decoded to BSON types.
+    """
+    decoder = json.JSONDecoder(object_hook=json_util.object_hook)
+    buffer = ''
+    pos = 0
+    eof = False
+    with open_dump(path, 'rt') as f:
+        while True:
+            # Skip whitespace and the array punctuation between documents
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,[]':
+                pos += 1
+            if pos >= len(buffer):
+                if eof:
+                    return
+                buffer = f.read(READ_CHUNK_SIZE)
+                pos = 0
+                eof = not buffer
+                continue
+            try:
+                document, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Document straddles the chunk boundary; read more and retry
+                chunk = f.read(READ_CHUNK_SIZE)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            pos = end
+            yield document
+
+
+def iter_dump(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.endswith('.bson'):
+        return iter_bson(path)
+    return iter_json(path)
+
+
+# --- Synthetic data -------------------------------------------------------
+
+MARKETS = [
+    # market, country, country_code, latitude, longitude, price range
+    ("Porto", "Portugal", "PT", 41.15, -8.61, (25, 250)),
+    ("Barcelona", "Spain", "ES", 41.39, 2.17, (30, 400)),
+    ("New York", "United States", "US", 40.73, -73.99, (60, 900)),
+    ("Oahu", "United States", "US", 21.31, -157.86, (80, 1200)),
+    ("Sydney", "Australia", "AU", -33.87, 151.21, (50, 700)),
+    ("Montreal", "Canada", "CA", 45.50, -73.57, (40, 400)),
+    ("Istanbul", "Turkey", "TR", 41.01, 28.98, (100, 1500)),
+    ("Hong Kong", "Hong Kong", "HK", 22.32, 114.17, (200, 2500)),
+    ("Rio De Janeiro", "Brazil", "BR", -22.91, -43.17, (80, 1500)),
+]
+PROPERTY_TYPES = [
+    ("Apartment", 60), ("House", 15), ("Condominium", 6), ("Serviced apartment", 4),
+    ("Loft", 3), ("Townhouse", 3), ("Guest suite", 2), ("Bed and breakfast", 2),
+    ("Villa", 2), ("Hostel", 1), ("Boutique hotel", 1), ("Cabin", 1),
+]
+ROOM_TYPES = ["Entire home/apt", "Private room", "Shared room"]
+CANCELLATION_POLICIES = ["flexible", "moderate", "strict_14_with_grace_period", "super_strict_30"]
+AMENITIES = [
+    "Wifi", "Kitchen", "Essentials", "Hangers", "Hair dryer", "Iron", "TV", "Heating",
+    "Air conditioning", "Washer", "Dryer", "Shampoo", "Hot water", "Elevator",
+    "Free parking on premises", "Pool", "Gym", "Hot tub", "Laptop friendly workspace",
+    "Family/kid friendly", "Pets allowed", "Smoke detector", "Carbon monoxide detector",
+    "First aid kit", "Fire extinguisher", "Self check-in", "Lockbox", "Patio or balcony",
+    "Garden or backyard", "Beach essentials", "Waterfront", "Coffee maker",
+]
+NAME_ADJECTIVES = ["Cozy", "Bright", "Charming", "Modern", "Spacious", "Quiet", "Stylish", "Sunny", "Lovely", "Central"]
+NAME_NOUNS = ["studio", "loft", "flat", "apartment", "home", "retreat", "room", "suite", "hideaway", "penthouse"]
+FIRST_NAMES = ["Ana", "Joao", "Maria", "David", "Sarah", "Chen", "Ayse", "Lucas", "Emma", "Noah", "Olivia", "Mehmet"]
+COMMENT_PHRASES = [
+    "Great location", "very clean", "the host was responsive", "would stay again",
+    "exactly as described", "easy check-in", "a bit noisy at night", "comfortable bed",
+    "close to public transport", "amazing view", "well equipped kitchen", "highly recommended",
+]
+
+
+def synthetic_listing(rng, listing_id, reviews_mean, reviews_max, now):
+    market, country, country_code, lat, lon, (low, high) = rng.choice(MARKETS)
+    property_type = rng.choices([p for p, _ in PROPERTY_TYPES], weights=[w for _, w in PROPERTY_TYPES])[0]
+    bedrooms = min(int(rng.expovariate(0.8)) + (0 if property_type in ("Hostel", "Guest suite") else 1), 10)
+    price = round(low * (high / low) ** (rng.random() ** 1.5) * (1 + 0.25 * bedrooms), 2)
+    last_scraped = now - timedelta(days=rng.randint(0, 60))
+
+    review_count = min(int(rng.expovariate(1 / reviews_mean)), reviews_max) if reviews_mean > 0 else 0
+    reviews = []
+    review_date = last_scraped - timedelta(days=rng.randint(30, 2500))
+    for n in range(review_count):
+        review_date += timedelta(days=rng.randint(1, 30))
+        reviews.append({
+            "_id": f"{listing_id}{n:05d}",
+            "date": review_date,
+            "listing_id": listing_id,
+            "reviewer_id": str(rng.randint(1, 10 ** 8)),
+            "reviewer_name": rng.choice(FIRST_NAMES),
+            "comments": ", ".join(rng.sample(COMMENT_PHRASES, rng.randint(1, 4))).capitalize() + ".",
+        })
+
+    rating = rng.randint(60, 100) if review_count else None
+    host_id = str(rng.randint(1, 10 ** 7))
+    name = f"{rng.choice(NAME_ADJECTIVES)} {rng.choice(NAME_NOUNS)} in {market}"
+    picture_url = f"https://picsum.photos/seed/{listing_id}/1200/800"
+    return {
+        "_id": listing_id,
+        "listing_url": f"https://www.airbnb.com/rooms/{listing_id}",
+        "name": name,
+        "summary": f"{name}. {rng.choice(COMMENT_PHRASES).capitalize()}.",
+        "description": f"{name}, sleeps {bedrooms * 2 or 1}.",
+        "house_rules": rng.choice(["", "No smoking", "No parties or events", "No pets"]),
+        "property_type": property_type,
+        "room_type": rng.choice(ROOM_TYPES),
+        "bed_type": "Real Bed",
+        "minimum_nights": str(rng.choice([1, 1, 2, 3, 7])),
+        "maximum_nights": str(rng.choice([30, 365, 1125])),
+        "cancellation_policy": rng.choice(CANCELLATION_POLICIES),
+        "last_scraped": last_scraped,
+        "calendar_last_scraped": last_scraped,
+        "first_review": reviews[0]["date"] if reviews else None,
+        "last_review": reviews[-1]["date"] if reviews else None,
+        "accommodates": max(1, bedrooms * 2),
+        "bedrooms": bedrooms,
+        "beds": max(1, bedrooms + rng.randint(0, 1)),
+        "number_of_reviews": review_count,
+        "bathrooms": Decimal128(Decimal(str(max(1.0, bedrooms * 0.5 + rng.choice([0, 0.5]))))),
+        "amenities": rng.sample(AMENITIES, rng.randint(5, len(AMENITIES))),
+        "price": Decimal128(Decimal(f"{price:.2f}")),
+        "cleaning_fee": Decimal128(Decimal(f"{price * 0.2:.2f}")),
+        "extra_people": Decimal128(Decimal(str(rng.choice([0, 10, 15, 20])))),
+        "guests_included": Decimal128(Decimal("1")),
+        "images": {
+            "thumbnail_url": "",
+            "medium_url": "",
+            "picture_url": picture_url,
+            "xl_picture_url": "",
+        },
+        "host": {
+            "host_id": host_id,
+            "host_url": f"https://www.airbnb.com/users/show/{host_id}",
+            "host_name": rng.choice(FIRST_NAMES),
+            "host_location": f"{market}, {country}",
+            "host_is_superhost": rng.random() < 0.2,
+            "host_listings_count": rng.randint(1, 20),
+        },
+        "address": {
+            "street": f"{market}, {country}",
+            "market": market,
+            "country": country,
+            "country_code": country_code,
+            "location": {
+                "type": "Point",
+                "coordinates": [round(lon + rng.gauss(0, 0.05), 6), round(lat + rng.gauss(0, 0.05), 6)],
+                "is_location_exact": rng.random() < 0.5,
+            },
+        },
+        "availability": {
+            "availability_30": rng.randint(0, 30),
+            "availability_60": rng.randint(0, 60),
+            "availability_90": rng.randint(0, 90),
+            "availability_365": rng.randint(0, 365),
+        },
+        "review_scores": {"review_scores_rating": rating} if rating is not None else {},
+        "reviews": reviews,
+    }
+
+
+def generate_listings(count, reviews_mean=10, reviews_max=500, seed=0, start_id=90000000):
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    for n in range(count):
+        yield synthetic_listing(rng, str(start_id + n), reviews_mean, reviews_max, now)
+
+
+# --- Loading --------------------------------------------------------------
+
+def batched(documents, batch_size):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert_batch(collection, batch):
+    # Stamp the load time so /api/sync/, autocomplete refreshes and build_similar.py see the listings
+    now = datetime.utcnow()
+    for document in batch:
+        document.setdefault('updated_at', now)
+    try:
+        return len(collection.insert_many(batch, ordered=False).inserted_ids), 0
+    except BulkWriteError as e:
+        # Unordered batches keep going past duplicates; count what made it in
+        inserted = e.details.get('nInserted', 0)
+        return inserted, len(batch) - inserted
+
+
+def load_documents(collection, documents, batch_size=1000, workers=8, report_every=50000):
+    """Insert `documents` with `workers` parallel unordered batches; returns load stats."""
+    started = time.perf_counter()
+    inserted = failed = 0
+    next_report = report_every
+    pending = set()
+
+    def collect(done):
+        nonlocal inserted, failed
+        for future in done:
+            ok, bad = future.result()
+            inserted += ok
+            failed += bad
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in batched(documents, batch_size):
+            # Bound the batches held in memory to a couple per worker
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(insert_batch, collection, batch))
+            if inserted >= next_report:
+                elapsed = time.perf_counter() - started
+                logger.info(f"{inserted:,} documents loaded ({inserted / elapsed:,.0f} docs/s)")
+                next_report = inserted + report_every
+        done, _ = wait(pending)
+        collect(done)
+
+    elapsed = time.perf_counter() - started
+    return {'inserted': inserted, 'failed': failed, 'seconds': elapsed,
+            'docs_per_second': inserted / elapsed if elapsed else 0.0}
+
+
+def build_indexes(collection):
+    started = time.perf_counter()
+    for keys, options in LISTING_INDEXES:
+        collection.create_index(keys, **options)
+    return time.perf_counter() - started
+
+
+def write_jsonl(path, documents):
+    started = time.perf_counter()
+    written = 0
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'wt', encoding='utf-8') as f:
+        for document in documents:
+            # Same output as json_util.dumps, but lets the C encoder handle plain types
+            f.write(json.dumps(document, default=json_util.default))
+            f.write('\n')
+            written += 1
+    elapsed = time.perf_counter() - started
+    return {'inserted': written, 'failed': 0, 'seconds': elapsed,
+            'docs_per_second': written / elapsed if elapsed else 0.0}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Bulk load or generate listings for the listings service")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_target_args(command):
+        command.add_argument('--uri', default=os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+        command.add_argument('--db', default=DEFAULT_DB)
+        command.add_argument('--collection', default=DEFAULT_COLLECTION)
+        command.add_argument('--batch-size', type=int, default=1000)
+        command.add_argument('--workers', type=int, default=8)
+        command.add_argument('--drop', action='store_true', help="Drop the target collection first")
+        command.add_argument('--no-indexes', action='store_true', help="Skip building indexes after the load")
+
+    load = commands.add_parser('load', help="Load a listingsAndReviews dump (.json, .jsonl, .bson, optionally .gz)")
+    load.add_argument('path')
+    add_target_args(load)
+
+    generate = commands.add_parser('generate', help="Generate synthetic listings")
+    generate.add_argument('--count', type=int, required=True)
+    generate.add_argument('--reviews-mean', type=float, default=10, help="Mean reviews per listing")
+    generate.add_argument('--reviews-max', type=int, default=500, help="Cap on reviews per listing")
+    generate.add_argument('--seed', type=int, default=0)
+    generate.add_argument('--start-id', type=int, default=90000000)
+    generate.add_argument('--output', help="Write JSON lines to this file instead of MongoDB")
+    add_target_args(generate)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    if args.command == 'load':
+        documents = iter_dump(args.path)
+    else:
+        documents = generate_listings(args.count, args.reviews_mean, args.reviews_max, args.seed, args.start_id)
+
+    if args.command == 'generate' and args.output:
+        stats = write_jsonl(args.output, documents)
+        logger.info(f"Wrote {stats['inserted']:,} listings to {args.output} in {stats['seconds']:.1f}s "
+                    f"({stats['docs_per_second']:,.0f} docs/s)")
+        return
+
+    client = MongoClient(args.uri, maxPoolSize=args.workers + 2)
+    collection = client[args.db][args.collection]
+    if args.drop:
+        logger.info(f"Dropping {args.db}.{args.collection}")
+        collection.drop()
+
+    stats = load_documents(collection, documents, args.batch_size, args.workers)
+    logger.info(f"Loaded {stats['inserted']:,} documents into {args.db}.{args.collection} in {stats['seconds']:.1f}s "
+                f"({stats['docs_per_second']:,.0f} docs/s, {stats['failed']:,} rejected)")
+    if not args.no_indexes:
+        logger.info(f"Built {len(LISTING_INDEXES)} indexes in {build_indexes(collection):.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""
+Listing Summaries
+
+Builds the compact listing summary returned by the list endpoints. Shared by the Flask
+app and the batch jobs that store denormalized summaries.
+"""
+
+from bson.decimal128 import Decimal128
+
+# Fields needed to build a listing summary (list, sync and similar-listings responses)
+SUMMARY_PROJECTION = {
+    "listing_id": 1, "name": 1, "price": 1, "thumbnail_url": 1, "picture_url": 1,
+    "images.picture_url": 1, "address.country": 1, "bedrooms": 1, "property_type": 1,
+    "review_scores_rating": 1,
+}
+
+def listing_summary(listing):
+    summary = {}
+    summary['_id'] = str(listing.get('_id', ''))
+    summary['listing_id'] = str(listing.get('listing_id', summary['_id']))
+    summary['name'] = listing.get('name', '')
+    summary['price'] = float(listing['price'].to_decimal()) if isinstance(listing.get('price'), Decimal128) else listing.get('price', 0)
+    # Always provide a picture_url field
+    picture_url = listing.get('thumbnail_url') or listing.get('picture_url')
+    if not picture_url and 'images' in listing and isinstance(listing['images'], dict):
+        picture_url = listing['images'].get('picture_url')
+    summary['picture_url'] = picture_url or None
+    summary['location'] = listing.get('address', {}).get('country', '')
+    summary['bedrooms'] = listing.get('bedrooms', 0)
+    summary['property_type'] = listing.get('property_type', '')
+    summary['review_scores_rating'] = listing.get('review_scores_rating', None)
+    return summary
@@ -0,0 +1,102 @@
+import copy
+import os
+import sys
+import tempfile
+from unittest import mock
+
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+# app.py connects to MongoDB and starts background work at import time; keep it offline
+os.makedirs(os.path.join(SERVICE_DIR, 'logs'), exist_ok=True)
+os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+os.environ.setdefault('IMAGE_CACHE_DIR', tempfile.mkdtemp(prefix='listings-image-cache-'))
+
+
+def matches(doc, query):
+    for field, condition in query.items():
+        value = doc.get(field)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        # Like MongoDB, range operators never match a missing field
+        if value is None and any(op in ('$gt', '$gte', '$lt') for op in condition):
+            return False
+        for op, operand in condition.items():
+            if op == '$gt' and not value > operand:
+                return False
+            if op == '$gte' and not value >= operand:
+                return False
+            if op == '$lt' and not value < operand:
+                return False
+            if op == '$in' and value not in operand:
+                return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = list(docs)
+
+    def sort(self, key, direction=1):
+        self.docs.sort(key=lambda doc: doc[key], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+
+class FakeCollection:
+    """Just enough of a pymongo collection for the queries the tested endpoints make."""
+
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+
+    def insert_one(self, doc):
+        self.docs.append(doc)
+
+    def insert_many(self, docs, ordered=True):
+        self.docs.extend(docs)
+
+    def find_one(self, query=None, projection=None):
+        return next(iter(self.find(query, projection)), None)
+
+    def find(self, query=None, projection=None):
+        return FakeCursor(copy.deepcopy(doc) for doc in self.docs if matches(doc, query or {}))
+
+    def aggregate(self, pipeline):
+        # Only the $match + $filter-by-review-ID pipeline used by /api/sync/
+        match, project = pipeline[0]['$match'], pipeline[1]['$project']
+        review_ids = project['reviews']['$filter']['cond']['$in'][1]
+        for doc in self.find(match):
+            yield {'_id': doc['_id'], 'reviews': [r for r in doc.get('reviews', []) if r['_id'] in review_ids]}
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    with mock.patch('pymongo.MongoClient'), mock.patch('threading.Thread.start'):
+        import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def auth_user(app_module, monkeypatch):
+    """Answer verify-token calls with the returned dict instead of calling the auth service."""
+    user = {'user_id': 7, 'is_staff': False, 'is_superuser': False}
+    response = mock.Mock(status_code=200)
+    response.json.side_effect = lambda: dict(user)
+    monkeypatch.setattr(app_module.requests, 'get', mock.Mock(return_value=response))
+    monkeypatch.setattr(app_module, 'verified_tokens', {})
+    return user
@@ -0,0 +1,90 @@
+from unittest import mock
+
+import pytest
+
+from admission import ConcurrencyLimiter, TokenBucketLimiter
+from conftest import FakeCollection
+
+
+@pytest.fixture
+def limiter(app_module, monkeypatch, tmp_path):
+    """Admission control on, with a tiny budget: 5 autocomplete calls (cost 0.2) per bucket."""
+    limiter = TokenBucketLimiter(str(tmp_path / 'limits.sqlite3'), rate=0.001, burst=1)
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_ENABLED', True)
+    monkeypatch.setattr(app_module, 'rate_limiter', limiter)
+    monkeypatch.setattr(app_module, 'concurrency_limiter', ConcurrencyLimiter(2, 5, 2))
+    monkeypatch.setattr(app_module, 'verified_tokens', {})
+    return limiter
+
+
+@pytest.fixture
+def auth_service(app_module, monkeypatch):
+    """verify-token accepts 'Bearer good' (user 7) and 'Bearer admin' (staff user 1)."""
+    def verify(url, headers, timeout):
+        if headers['Authorization'] == 'Bearer good':
+            return mock.Mock(status_code=200, json=lambda: {'user_id': 7})
+        if headers['Authorization'] == 'Bearer admin':
+            return mock.Mock(status_code=200, json=lambda: {'user_id': 1, 'is_staff': True})
+        return mock.Mock(status_code=401, json=lambda: {'detail': 'invalid'})
+    calls = mock.Mock(side_effect=verify)
+    monkeypatch.setattr(app_module.requests, 'get', calls)
+    return calls
+
+
+def autocomplete(client, token=None):
+    headers = {'Authorization': token} if token else {}
+    return client.get('/api/autocomplete/?q=po', headers=headers)
+
+
+def test_token_bucket_reports_retry_after(tmp_path):
+    limiter = TokenBucketLimiter(str(tmp_path / 'limits.sqlite3'), rate=2, burst=4)
+    assert limiter.take('k', 4) == (True, 0.0)
+    allowed, retry_after = limiter.take('k', 3)
+    assert not allowed
+    assert 1.0 < retry_after <= 1.5
+
+
+def test_rejection_carries_retry_after(client, limiter):
+    statuses = [autocomplete(client).status_code for _ in range(6)]
+    assert statuses == [200] * 5 + [429]
+    assert int(autocomplete(client).headers['Retry-After']) >= 1
+
+
+def test_made_up_tokens_spend_from_the_ip_bucket(client, limiter, auth_service):
+    statuses = [autocomplete(client, f'Bearer fake-{i}').status_code for i in range(8)]
+    assert statuses == [200] * 5 + [429] * 3
+    # Rejected requests never reach the auth service
+    assert auth_service.call_count == 5
+
+
+def test_verified_user_gets_own_bucket(client, limiter, auth_service):
+    assert autocomplete(client, 'Bearer good').status_code == 200
+    while autocomplete(client).status_code == 200:
+        pass
+    # The first request also spent from the user's bucket
+    assert [autocomplete(client, 'Bearer good').status_code for _ in range(4)] == [200] * 4
+    assert autocomplete(client, 'Bearer good').status_code == 429
+    assert auth_service.call_count == 1
+
+
+def test_admins_get_a_larger_budget(client, limiter, auth_service, app_module):
+    admitted = 0
+    while autocomplete(client, 'Bearer admin').status_code == 200:
+        admitted += 1
+    assert admitted == 5 * app_module.RATE_LIMIT_ADMIN_MULTIPLIER
+
+
+def test_concurrency_cap_sheds_with_retry_after(client, limiter, app_module):
+    app_module.concurrency_limiter.acquire('ip:127.0.0.1', 1)
+    app_module.concurrency_limiter.acquire('ip:127.0.0.1', 1)
+    response = autocomplete(client)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_thumbnails_skip_the_per_client_concurrency_cap(client, limiter, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'homes', FakeCollection())
+    app_module.concurrency_limiter.acquire('ip:127.0.0.1', 1)
+    app_module.concurrency_limiter.acquire('ip:127.0.0.1', 1)
+    # Not shed: reaches the view, which finds no such listing
+    assert client.get('/api/listing/L1/image/').status_code == 404
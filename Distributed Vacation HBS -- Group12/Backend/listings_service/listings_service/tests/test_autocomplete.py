@@ -0,0 +1,66 @@
+import os
+
+from autocomplete import SCAN_LIMIT, AutocompleteIndex, PrefixIndex, normalize
+from conftest import FakeCollection
+
+
+def test_normalize_strips_accents_and_case():
+    assert normalize('  São   Paulo ') == 'sao paulo'
+
+
+def test_search_ranks_by_popularity():
+    index = PrefixIndex({'Porto': 5, 'Portugal': 9, 'Paris': 20})
+    assert [value for value, _ in index.search('port')] == ['Portugal', 'Porto']
+
+
+def test_short_and_empty_keys_do_not_block_precompute():
+    popularity = {f'ab{i:05d}': i for i in range(SCAN_LIMIT + 1000)}
+    popularity.update({'   ': 3, 'A': 1})
+    index = PrefixIndex(popularity)
+    assert {'', 'a', 'ab'} <= set(index.top)
+    assert '   ' not in index.values
+    assert index.search('ab')[0] == (f'ab{SCAN_LIMIT + 999:05d}', SCAN_LIMIT + 999)
+
+
+def test_long_prefixes_with_large_ranges_are_precomputed():
+    popularity = {f'Cozy loft {i:05d}': i + 1 for i in range(3 * SCAN_LIMIT)}
+    popularity.update({f'Sunny room {i}': 1 for i in range(50)})
+    index = PrefixIndex(popularity)
+    assert 'cozy loft 0' in index.top
+    # No keystroke ranks more than SCAN_LIMIT terms on the fly
+    for key in index.keys:
+        for length in range(len(key) + 1):
+            start, end = index._range(key[:length])
+            assert key[:length] in index.top or end - start <= SCAN_LIMIT
+    assert index.search('cozy lo')[0] == (f'Cozy loft {3 * SCAN_LIMIT - 1:05d}', 3 * SCAN_LIMIT)
+
+
+class CountingCollection(FakeCollection):
+    full_name = 'sample_airbnb.listingsAndReviews'
+
+    def __init__(self, docs):
+        super().__init__(docs)
+        self.full_scans = 0
+
+    def find(self, query=None, projection=None):
+        if not query:
+            self.full_scans += 1
+        return super().find(query, projection)
+
+
+def test_snapshot_is_shared_only_while_private(tmp_path):
+    collection = CountingCollection([{'_id': 'L1', 'name': 'Cozy loft'}])
+    path = str(tmp_path / 'snapshot' / 'index.pickle')
+    AutocompleteIndex(collection, snapshot_path=path).load_or_build()
+    assert os.stat(os.path.dirname(path)).st_mode & 0o777 == 0o700
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+    loaded = AutocompleteIndex(collection, snapshot_path=path)
+    loaded.load_or_build()
+    assert collection.full_scans == 1
+    assert loaded.search('name', 'coz') == [('Cozy loft', 1)]
+
+    # A snapshot others could have replaced is rebuilt rather than unpickled
+    os.chmod(path, 0o666)
+    AutocompleteIndex(collection, snapshot_path=path).load_or_build()
+    assert collection.full_scans == 2
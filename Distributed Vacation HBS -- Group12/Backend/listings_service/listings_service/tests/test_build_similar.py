@@ -0,0 +1,109 @@
+import copy
+from datetime import datetime, timedelta
+
+import pytest
+from bson.decimal128 import Decimal128
+
+import build_similar as build_similar_module
+from build_similar import build_similar
+from conftest import FakeCollection
+from load_listings import generate_listings
+
+
+class JobCollection(FakeCollection):
+    """FakeCollection plus the writes build_similar.py makes."""
+
+    def bulk_write(self, operations, ordered=True):
+        for op in operations:
+            self.delete_many(op._filter)
+            self.insert_one(dict(op._doc, **op._filter))
+
+    def delete_many(self, query):
+        self.docs = [doc for doc in self.docs if not self._matches(doc, query)]
+
+    def update_one(self, query, update, upsert=False):
+        doc = self.find_one(query)
+        self.delete_many(query)
+        self.insert_one(dict(doc or query, **update['$set']))
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    def _matches(self, doc, query):
+        return any(True for _ in FakeCollection([doc]).find(query))
+
+
+def make_db(listings):
+    return {'homes': JobCollection(listings), 'similar_listings': JobCollection(), 'batch_jobs': JobCollection()}
+
+
+def neighbours(db):
+    return {doc['_id']: [n['_id'] for n in doc['similar']] for doc in db['similar_listings'].docs}
+
+
+def rebuilt(db):
+    """Every listing recomputed from scratch with the scaling the incremental run used."""
+    fresh = make_db(copy.deepcopy(db['homes'].docs))
+    fresh['batch_jobs'].docs = copy.deepcopy(db['batch_jobs'].docs)
+    stats = build_similar(fresh, 'homes')
+    assert stats['recomputed'] == stats['listings']
+    return neighbours(fresh)
+
+
+@pytest.fixture
+def db():
+    listings = list(generate_listings(600, reviews_mean=0, reviews_max=0))
+    for listing in listings:
+        listing['updated_at'] = datetime.utcnow() - timedelta(days=1)
+    db = make_db(listings)
+    build_similar(db, 'homes')
+    return db
+
+
+def test_incremental_price_change_matches_full_rebuild(db):
+    listing = db['homes'].docs[0]
+    listing['price'] = Decimal128('9500.00')
+    listing['updated_at'] = datetime.utcnow()
+    stats = build_similar(db, 'homes')
+    assert stats['recomputed'] < stats['listings']
+    assert neighbours(db) == rebuilt(db)
+
+
+def test_incremental_deletion_matches_full_rebuild(db):
+    removed = db['homes'].docs.pop(0)['_id']
+    stats = build_similar(db, 'homes')
+    assert stats['removed'] == 1
+    assert removed not in neighbours(db)
+    assert neighbours(db) == rebuilt(db)
+
+
+def test_incremental_run_reuses_the_stored_scaling(db):
+    model = db['batch_jobs'].find_one({'_id': 'similar_listings'})['model']
+    for listing in db['homes'].docs[:50]:
+        listing['price'] = Decimal128('9500.00')
+        listing['updated_at'] = datetime.utcnow()
+    build_similar(db, 'homes')
+    assert db['batch_jobs'].find_one({'_id': 'similar_listings'})['model'] == model
+
+
+def test_full_build_removes_deleted_listings(db):
+    removed = db['homes'].docs.pop(0)['_id']
+    stats = build_similar(db, 'homes', full=True)
+    assert stats['removed'] == 1
+    assert removed not in neighbours(db)
+
+
+def test_summaries_are_read_in_batches(db, monkeypatch):
+    monkeypatch.setattr(build_similar_module, 'READ_BATCH_SIZE', 7)
+    lookups = []
+    find = db['homes'].find
+
+    def spy(query=None, projection=None):
+        if query:
+            lookups.append(len(query['_id']['$in']))
+        return find(query, projection)
+
+    monkeypatch.setattr(db['homes'], 'find', spy)
+    build_similar(db, 'homes', full=True)
+    assert lookups and max(lookups) <= 7
+    assert all(len(ids) == 10 for ids in neighbours(db).values())
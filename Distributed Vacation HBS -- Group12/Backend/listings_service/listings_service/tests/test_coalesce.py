@@ -0,0 +1,149 @@
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+import coalesce
+from coalesce import SingleFlight
+
+# Long enough for every concurrent caller to be waiting before the leader finishes
+FETCH_SECONDS = 0.5
+
+
+class Origin:
+    """Stands in for a MongoDB fetch: counts calls, can block until released or fail."""
+
+    def __init__(self, error=None):
+        self.calls = 0
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.error = error
+
+    def __call__(self):
+        self.calls += 1
+        self.entered.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return f'body {self.calls}'.encode(), 200
+
+
+def run_concurrently(flight, key, origin, waiters=8):
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flight.do(key, origin))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    assert origin.entered.wait(5)
+    threads += [threading.Thread(target=call) for _ in range(waiters)]
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.2)
+    origin.release.set()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+def test_waiters_share_the_leaders_fetch():
+    origin = Origin()
+    results, errors = run_concurrently(SingleFlight(), ('listing', 'L1'), origin)
+    assert origin.calls == 1
+    assert errors == []
+    assert results == [(b'body 1', 200)] * 9
+
+
+def test_leader_error_reaches_every_waiter():
+    error = RuntimeError('mongo down')
+    origin = Origin(error=error)
+    results, errors = run_concurrently(SingleFlight(), ('listing', 'L1'), origin)
+    assert origin.calls == 1
+    assert results == []
+    assert errors == [error] * 9
+
+
+def test_different_keys_do_not_wait_for_each_other():
+    flight = SingleFlight()
+    blocked = Origin()
+    thread = threading.Thread(target=flight.do, args=(('listing', 'L1'), blocked))
+    thread.start()
+    assert blocked.entered.wait(5)
+    assert flight.do(('listing', 'L2'), lambda: (b'other', 200)) == (b'other', 200)
+    blocked.release.set()
+    thread.join(5)
+
+
+def test_completed_call_is_not_reused():
+    flight = SingleFlight()
+    origin = Origin()
+    origin.release.set()
+    assert flight.do('key', origin) == (b'body 1', 200)
+    assert flight.do('key', origin) == (b'body 2', 200)
+
+
+@pytest.mark.skipif(coalesce.fcntl is None, reason="cross-worker coalescing needs fcntl")
+class TestSharedDir:
+    def test_later_request_fetches_again(self, tmp_path):
+        # Each call is a new arrival, so a result written earlier must not be served
+        flight = SingleFlight(shared_dir=str(tmp_path))
+        origin = Origin()
+        origin.release.set()
+        assert flight.do('key', origin) == (b'body 1', 200)
+        assert flight.do('key', origin) == (b'body 2', 200)
+
+    def test_server_errors_are_not_shared(self, tmp_path):
+        flight = SingleFlight(shared_dir=str(tmp_path))
+        assert flight.do('key', lambda: (b'oops', 503)) == (b'oops', 503)
+        assert os.listdir(tmp_path) == ['locks']
+
+    def test_workers_waiting_on_a_key_share_one_fetch(self, tmp_path):
+        results = run_workers(tmp_path, ['key'] * 4)
+        assert fetch_count(tmp_path) == 1
+        assert len(set(results)) == 1
+
+    def test_workers_fetch_different_keys_in_parallel(self, tmp_path):
+        started = time.monotonic()
+        results = run_workers(tmp_path, [f'key {n}' for n in range(4)])
+        assert fetch_count(tmp_path) == 4
+        assert len(set(results)) == 4
+        # One lock per key: serialized fetches would take 4 * FETCH_SECONDS
+        assert time.monotonic() - started < 3 * FETCH_SECONDS
+
+
+def worker_fetch(shared_dir, key, start, results):
+    def fetch():
+        with open(os.path.join(shared_dir, 'fetches'), 'a') as f:
+            f.write(f'{os.getpid()}\n')
+        time.sleep(FETCH_SECONDS)
+        return f'{key} from {os.getpid()}'.encode(), 200
+
+    flight = SingleFlight(shared_dir=os.path.join(shared_dir, 'coalesce'))
+    start.wait(5)
+    body, _ = flight.do(key, fetch)
+    results.put(body)
+
+
+def run_workers(tmp_path, keys):
+    ctx = multiprocessing.get_context('fork')
+    start, results = ctx.Event(), ctx.Queue()
+    workers = [ctx.Process(target=worker_fetch, args=(str(tmp_path), key, start, results)) for key in keys]
+    for worker in workers:
+        worker.start()
+    start.set()
+    bodies = [results.get(timeout=10) for _ in workers]
+    for worker in workers:
+        worker.join(5)
+        assert worker.exitcode == 0
+    return bodies
+
+
+def fetch_count(tmp_path):
+    with open(tmp_path / 'fetches') as f:
+        return len(f.read().splitlines())
@@ -0,0 +1,100 @@
+import io
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from conftest import FakeCollection
+from image_cache import DiskLRUCache, ImageSourceError, SIZES, fill_cache, raise_cached_failure, variant_key
+
+
+def png_bytes(width=1200, height=900):
+    out = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 80, 40)).save(out, 'PNG')
+    return out.getvalue()
+
+
+class Origin:
+    """Local HTTP origin: /ok.png serves an image, anything else answers 500."""
+
+    def __init__(self):
+        self.hits = []
+        image = png_bytes()
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                origin.hits.append(self.path)
+                if self.path == '/ok.png':
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'image/png')
+                    self.send_header('Content-Length', str(len(image)))
+                    self.end_headers()
+                    self.wfile.write(image)
+                else:
+                    self.send_response(500)
+                    self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server.server_port}{path}"
+
+
+@pytest.fixture
+def origin():
+    origin = Origin()
+    yield origin
+    origin.server.shutdown()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskLRUCache(str(tmp_path / 'images'), max_bytes=50 * 1024 * 1024, max_age_seconds=3600)
+
+
+def test_fill_cache_renders_every_size(cache, origin):
+    fill_cache(cache, 'L1', origin.url('/ok.png'), 'jpeg')
+    assert origin.hits == ['/ok.png']
+    for size, edge in SIZES.items():
+        body, etag, mimetype = cache.get(variant_key('L1', size, 'jpeg'))
+        assert mimetype == 'image/jpeg'
+        assert max(Image.open(io.BytesIO(body)).size) == edge
+
+
+def test_failed_fetch_is_cached_for_its_ttl(cache, origin):
+    with pytest.raises(ImageSourceError):
+        fill_cache(cache, 'L1', origin.url('/broken.png'), 'jpeg', failure_ttl=1)
+    with pytest.raises(ImageSourceError) as error:
+        raise_cached_failure(cache, 'L1')
+    assert error.value.status == 502
+    assert origin.hits == ['/broken.png']
+    time.sleep(1.1)
+    raise_cached_failure(cache, 'L1')
+
+
+def test_workers_sharing_a_directory_stay_near_the_limit(tmp_path):
+    directory = str(tmp_path / 'shared')
+    limit = 1024 * 1024
+    workers = [DiskLRUCache(directory, max_bytes=limit, max_age_seconds=3600) for _ in range(4)]
+    body = os.urandom(16 * 1024)
+    for i in range(400):
+        workers[i % 4].set(f'key-{i}', body, 'image/jpeg')
+    total = sum(entry.stat().st_size for entry in os.scandir(directory))
+    assert total <= limit * (1 + len(workers) * DiskLRUCache.RESCAN_FRACTION) + len(body)
+
+
+def test_dead_picture_url_hits_the_origin_once(app_module, client, monkeypatch, tmp_path, origin):
+    homes = FakeCollection([{'_id': 'L1', 'listing_id': 'L1', 'picture_url': origin.url('/broken.png')}])
+    monkeypatch.setattr(app_module, 'homes', homes)
+    monkeypatch.setattr(app_module, 'image_cache', DiskLRUCache(str(tmp_path / 'images'), 10 * 1024 * 1024, 3600))
+    for _ in range(3):
+        assert client.get('/api/listing/L1/image/').status_code == 502
+    assert origin.hits == ['/broken.png']
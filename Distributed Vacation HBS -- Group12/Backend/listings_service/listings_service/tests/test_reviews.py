@@ -0,0 +1,61 @@
+from unittest import mock
+
+import pytest
+
+from conftest import FakeCollection
+
+
+@pytest.fixture
+def db(app_module, monkeypatch):
+    homes = FakeCollection([
+        {'_id': 'L1', 'reviews': [{'_id': 'r1'}, {'_id': 'r2'}]},
+        {'_id': 'L2', 'reviews': []},
+    ])
+    homes.bulk_write = mock.Mock(return_value=mock.Mock(matched_count=0, modified_count=0))
+    changes = FakeCollection()
+    monkeypatch.setattr(app_module, 'homes', homes)
+    monkeypatch.setattr(app_module, 'listing_changes', changes)
+    return homes, changes
+
+
+def bulk(client, operations):
+    return client.post(
+        '/admin/reviews/bulk/',
+        json={'operations': operations},
+        headers={'Authorization': 'Bearer admin'},
+    )
+
+
+def test_bulk_moderation_only_logs_reviews_that_exist(client, db, auth_user):
+    auth_user['is_staff'] = True
+    homes, changes = db
+    response = bulk(client, [
+        {'listing_id': 'L1', 'review_id': 'r1', 'action': 'delete'},
+        {'listing_id': 'L1', 'review_id': 'nope', 'action': 'delete'},
+        {'listing_id': 'L1', 'review_id': 'r2', 'action': 'update', 'comments': 'edited'},
+        {'listing_id': 'L2', 'review_id': 'ghost', 'action': 'update', 'comments': 'edited'},
+        {'listing_id': 'missing', 'review_id': 'r1', 'action': 'delete'},
+    ])
+    assert response.status_code == 200
+    assert homes.bulk_write.called
+    logged = sorted((c['listing_id'], c['op'], c['review_id']) for c in changes.docs)
+    assert logged == [('L1', 'delete', 'r1'), ('L1', 'upsert', 'r2')]
+
+
+def test_bulk_moderation_requires_staff(client, db, auth_user):
+    homes, changes = db
+    response = bulk(client, [{'listing_id': 'L1', 'review_id': 'r1', 'action': 'delete'}])
+    assert response.status_code == 403
+    assert not homes.bulk_write.called
+
+
+@pytest.mark.parametrize('flag', ['is_staff', 'is_superuser'])
+def test_bulk_moderation_accepts_admin_flags(client, db, auth_user, flag):
+    auth_user[flag] = True
+    response = bulk(client, [{'listing_id': 'L1', 'review_id': 'r1', 'action': 'delete'}])
+    assert response.status_code == 200
+
+
+def test_bulk_moderation_requires_token(client, db):
+    response = client.post('/admin/reviews/bulk/', json={'operations': []})
+    assert response.status_code == 401
@@ -0,0 +1,219 @@
+import itertools
+import struct
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from conftest import FakeCollection
+
+_counter = itertools.count(1)
+
+
+def change_id(when):
+    """An ObjectId generated at `when`; unique even within one second."""
+    seconds = int((when - datetime(1970, 1, 1)).total_seconds())
+    return ObjectId(struct.pack('>I', seconds) + b'\0' * 5 + next(_counter).to_bytes(3, 'big'))
+
+
+class SyncDB:
+    def __init__(self):
+        self.homes = FakeCollection()
+        self.changes = FakeCollection()
+
+    def listing(self, listing_id, review_ids=(), updated_seconds_ago=None):
+        listing = {
+            '_id': listing_id, 'name': listing_id,
+            'reviews': [{'_id': review_id, 'comments': 'ok'} for review_id in review_ids],
+        }
+        if updated_seconds_ago is not None:
+            listing['updated_at'] = datetime.utcnow() - timedelta(seconds=updated_seconds_ago)
+        self.homes.insert_one(listing)
+
+    def change(self, seconds_ago, listing_id, op, review_id):
+        when = datetime.utcnow() - timedelta(seconds=seconds_ago)
+        entry = {
+            '_id': change_id(when),
+            'kind': 'review',
+            'op': op,
+            'listing_id': listing_id,
+            'review_id': review_id,
+            'ts': when,
+        }
+        self.changes.insert_one(entry)
+        return entry['_id']
+
+
+@pytest.fixture
+def db(app_module, monkeypatch):
+    db = SyncDB()
+    monkeypatch.setattr(app_module, 'homes', db.homes)
+    monkeypatch.setattr(app_module, 'listing_changes', db.changes)
+    return db
+
+
+def sync(client, since, limit=None):
+    query = {'since': str(since)}
+    if limit is not None:
+        query['limit'] = limit
+    response = client.get('/api/sync/', query_string=query)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_bootstrap_returns_settled_token(client, db, app_module):
+    body = client.get('/api/sync/').get_json()
+    assert body['reset'] is True
+    token_time = ObjectId(body['next_token']).generation_time.replace(tzinfo=None)
+    assert token_time <= datetime.utcnow() - timedelta(seconds=app_module.SYNC_SETTLE_SECONDS - 1)
+
+
+def test_invalid_since_is_rejected(client, db):
+    assert client.get('/api/sync/?since=yesterday').status_code == 400
+
+
+def test_future_watermark_resets(client, db, app_module):
+    db.listing('L1', ['r1'])
+    db.change(30, 'L1', 'upsert', 'r1')
+    body = sync(client, (datetime.utcnow() + timedelta(days=365)).isoformat() + 'Z')
+    assert body['reset'] is True
+    # The replacement token is the server's own, so later syncs see new changes again
+    assert ObjectId(body['next_token']).generation_time.replace(tzinfo=None) <= datetime.utcnow()
+
+
+def test_token_slightly_ahead_is_clamped(client, db):
+    db.listing('L1', ['r1'])
+    db.change(0, 'L1', 'upsert', 'r1')
+    body = sync(client, change_id(datetime.utcnow()))
+    assert body['reset'] is False
+    # The held-back change is still ahead of the clamped token
+    assert ObjectId(body['next_token']) < db.changes.docs[0]['_id']
+
+
+@pytest.mark.parametrize('limit', [0, -3])
+def test_limit_is_at_least_one(client, db, limit):
+    db.listing('L1', ['r1', 'r2'])
+    start = change_id(datetime.utcnow() - timedelta(minutes=5))
+    db.change(40, 'L1', 'upsert', 'r1')
+    db.change(30, 'L1', 'upsert', 'r2')
+    body = sync(client, start, limit=limit)
+    assert [review['_id'] for review in body['reviews']] == ['r1']
+    assert body['has_more'] is True
+
+
+def test_expired_token_resets(client, db, app_module):
+    old = change_id(datetime.utcnow() - timedelta(days=app_module.SYNC_RETENTION_DAYS + 1))
+    db.listing('L1', ['r1'])
+    db.change(60, 'L1', 'upsert', 'r1')
+    body = sync(client, old)
+    assert body['reset'] is True
+    assert body['reviews'] == []
+
+
+def test_settle_window_holds_back_recent_changes(client, db):
+    db.listing('L1', ['r1', 'r2'])
+    start = change_id(datetime.utcnow() - timedelta(minutes=5))
+    db.change(30, 'L1', 'upsert', 'r1')
+    recent = db.change(0, 'L1', 'upsert', 'r2')
+    body = sync(client, start)
+    assert [review['_id'] for review in body['reviews']] == ['r1']
+    # The held-back change sorts after the returned token, so the next call picks it up
+    assert ObjectId(body['next_token']) < recent
+
+
+def test_has_more_resumes_without_gaps_or_duplicates(client, db):
+    db.listing('L1', ['r1', 'r2', 'r3'])
+    start = change_id(datetime.utcnow() - timedelta(minutes=5))
+    for seconds_ago, review_id in ((40, 'r1'), (30, 'r2'), (20, 'r3')):
+        db.change(seconds_ago, 'L1', 'upsert', review_id)
+    first = sync(client, start, limit=2)
+    assert first['has_more'] is True
+    second = sync(client, first['next_token'], limit=2)
+    assert second['has_more'] is False
+    seen = [review['_id'] for review in first['reviews'] + second['reviews']]
+    assert seen == ['r1', 'r2', 'r3']
+    assert sync(client, second['next_token'])['reviews'] == []
+
+
+def test_review_tombstones(client, db):
+    db.listing('L1', ['r1'])
+    start = change_id(datetime.utcnow() - timedelta(minutes=5))
+    db.change(40, 'L1', 'upsert', 'r2')
+    db.change(30, 'L1', 'delete', 'r2')
+    # Logged as written, but the review is gone by the time the client syncs
+    db.change(20, 'L1', 'upsert', 'r3')
+    body = sync(client, start)
+    assert body['reviews'] == []
+    tombstones = {review['review_id']: review for review in body['deleted']['reviews']}
+    assert set(tombstones) == {'r2', 'r3'}
+    assert tombstones['r2']['deleted_at'] is not None
+    assert tombstones['r3']['deleted_at'] is None
+
+
+def test_missing_listing_is_tombstoned(client, db):
+    start = change_id(datetime.utcnow() - timedelta(minutes=5))
+    db.change(30, 'gone', 'upsert', 'r1')
+    body = sync(client, start)
+    assert body['listings'] == []
+    assert body['deleted']['listings'] == [{'listing_id': 'gone', 'deleted_at': None}]
+
+
+def test_listings_written_outside_review_endpoints(client, db):
+    # e.g. inserted by load_listings.py, which stamps updated_at but logs nothing
+    db.listing('old', updated_seconds_ago=600)
+    db.listing('new', updated_seconds_ago=30)
+    db.listing('unstamped')
+    db.listing('recent', updated_seconds_ago=0)
+    start = change_id(datetime.utcnow() - timedelta(minutes=5))
+    body = sync(client, start)
+    assert [listing['_id'] for listing in body['listings']] == ['new']
+    assert [listing['_id'] for listing in sync(client, body['next_token'])['listings']] == []
+
+
+def test_listing_pages_split_on_whole_seconds(client, db):
+    for n, seconds_ago in enumerate((50, 40, 40, 30)):
+        db.listing(f'L{n}', updated_seconds_ago=seconds_ago)
+    start = change_id(datetime.utcnow() - timedelta(minutes=5))
+    first = sync(client, start, limit=2)
+    assert first['has_more'] is True
+    # The second L-at-40s would not fit, so the page stops before that whole second
+    assert [listing['_id'] for listing in first['listings']] == ['L0']
+    second = sync(client, first['next_token'], limit=2)
+    third = sync(client, second['next_token'], limit=2)
+    assert [listing['_id'] for listing in second['listings']] == ['L1', 'L2']
+    assert [listing['_id'] for listing in third['listings']] == ['L3']
+    assert third['has_more'] is False
+
+
+def test_bulk_load_within_one_second_resets(client, db):
+    for n in range(3):
+        db.listing(f'L{n}', updated_seconds_ago=30)
+    start = change_id(datetime.utcnow() - timedelta(minutes=5))
+    first = sync(client, start, limit=2)
+    assert first['listings'] == [] and first['has_more'] is True
+    # That second cannot be split across pages, so the client reloads instead
+    assert sync(client, first['next_token'], limit=2)['reset'] is True
+
+
+def test_iso_watermark_counts_whole_second(client, db, app_module):
+    db.listing('L1', ['r1', 'r2'])
+    db.change(60, 'L1', 'upsert', 'r1')
+    db.change(59, 'L1', 'upsert', 'r2')
+    first = db.changes.docs[0]['ts'].replace(microsecond=500000)
+    body = sync(client, first.isoformat() + 'Z')
+    assert [review['_id'] for review in body['reviews']] == ['r2']
+
+
+@pytest.mark.parametrize('since, expected', [
+    ('2024-05-01T10:00:00', datetime(2024, 5, 1, 10, 0, 1)),
+    ('2024-05-01T10:00:00.750Z', datetime(2024, 5, 1, 10, 0, 1)),
+    ('2024-05-01T12:00:00.750+02:00', datetime(2024, 5, 1, 10, 0, 1)),
+])
+def test_parse_sync_token_rounds_watermark_up(app_module, since, expected):
+    token = app_module.parse_sync_token(since)
+    assert token.generation_time.replace(tzinfo=None) == expected
+
+
+def test_parse_sync_token_accepts_resume_token(app_module):
+    token = ObjectId()
+    assert app_module.parse_sync_token(str(token)) == token
@@ -94,8 +94,8 @@ class VacationHomeAdapter(
                 locationTextView.text = vacationHome.location ?: "Location not available"
                 ratingTextView.text = vacationHome.rating?.let { "★ ${it}" } ?: "No ratings"
 
-                // Load image with error handling
-                val imageUrl = vacationHome.pictureUrl ?: ""
+                // Load image with error handling; prefer the server-side thumbnail over the full-size original
+                val imageUrl = vacationHome.thumbnailUrl ?: vacationHome.pictureUrl ?: ""
                 if (imageUrl.isNotEmpty()) {
                     Glide.with(context)
                         .load(imageUrl)
@@ -73,6 +73,8 @@ data class VacationHome(
     val reviews: List<Review> = emptyList(),
     @SerializedName("picture_url")
     val pictureUrl: String? = null,
+    @SerializedName("thumbnail_url")
+    val thumbnailUrl: String? = null,
     @SerializedName("listing_id")
     val listingId: String? = null,
     @SerializedName("location")